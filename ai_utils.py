@@ -1,17 +1,10 @@
 from typing import Dict, Any, Optional
-import openai
-from openai import OpenAI
+from functools import lru_cache
 import os
-from dotenv import load_dotenv
+from pydantic import ValidationError
 from models import FlightParams, AIResponse
 import json
 from datetime import datetime
-import pytz
-import re
-load_dotenv()
-
-# Initialize the OpenAI client with your API key
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 FLIGHT_PARAMS_SCHEMA = {
     "type": "object",
@@ -75,6 +68,24 @@ FLIGHT_PARAMS_SCHEMA = {
 }
 
 
+def create_client():
+    """
+    Build an OpenAI client. openai and .env loading are deferred to first use
+    so importing this module stays cheap.
+    """
+    from dotenv import load_dotenv
+    from openai import OpenAI
+
+    load_dotenv()
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+@lru_cache(maxsize=None)
+def get_client():
+    """Process-wide OpenAI client, shared so every caller reuses one connection pool."""
+    return create_client()
+
+
 def load_system_prompt() -> str:
     """Load the system prompt from booking_prompt.json"""
     try:
@@ -90,39 +101,57 @@ def load_system_prompt() -> str:
         raise
 
 
+def fetch_model_response(
+    prompt: str,
+    current_params: FlightParams,
+    client=None
+) -> AIResponse:
+    """
+    Get structured response from OpenAI using JSON mode.
+
+    Uses the process-wide client unless one is passed in. Raises if the call
+    fails or the reply isn't a valid AIResponse; see get_model_response for
+    the conversational fallback.
+    """
+    # Load the system prompt
+    system_prompt = load_system_prompt()
+
+    response = (client or get_client()).chat.completions.create(
+        model="gpt-4-1106-preview",
+        response_format={"type": "json_object"},
+        messages=[
+            {
+                "role": "system",
+                "content": system_prompt
+            },
+            {
+                "role": "user",
+                "content": f"Current parameters: {current_params.json()}\nUser input: {prompt}"
+            }
+        ]
+    )
+
+    # Parse the response and ensure it's valid
+    content = response.choices[0].message.content
+    print(f"Debug - AI Response content: {content}")  # Add debug logging
+
+    parsed_response = json.loads(content)
+    return AIResponse(**parsed_response)
+
+
 def get_model_response(
     prompt: str, 
-    current_params: FlightParams
+    current_params: FlightParams,
+    client=None
 ) -> AIResponse:
     """
     Get structured response from OpenAI using JSON mode.
+
+    Uses the process-wide client unless one is passed in. On failure returns
+    an apology asking the user to rephrase, so a chat can carry on.
     """
     try:
-        # Load the system prompt
-        system_prompt = load_system_prompt()
-        
-        response = client.chat.completions.create(
-            model="gpt-4-1106-preview",
-            response_format={"type": "json_object"},
-            messages=[
-                {
-                    "role": "system", 
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": f"Current parameters: {current_params.json()}\nUser input: {prompt}"
-                }
-            ]
-        )
-        
-        # Parse the response and ensure it's valid
-        content = response.choices[0].message.content
-        print(f"Debug - AI Response content: {content}")  # Add debug logging
-        
-        parsed_response = json.loads(content)
-        return AIResponse(**parsed_response)
-
+        return fetch_model_response(prompt, current_params, client)
     except Exception as e:
         print(f"Error getting model response: {str(e)}")
         # Return a default AIResponse instead of None
@@ -144,6 +173,7 @@ def parse_json_from_text(text: str) -> Dict[str, Any]:
     Returns:
         A dictionary representing the parsed JSON.
     """
+    import re
 
 
     if not any(char in text for char in "{["):
@@ -182,13 +212,45 @@ def update_parameters(
 ) -> FlightParams:
     """
     Update current parameters with new values from AI response.
+
+    The merged parameters are validated, so a reply like departure_id="Paris"
+    raises ValidationError instead of being saved. A null in the reply clears
+    that parameter.
     """
     update_data = ai_response.dict(exclude_unset=True)
     # Remove only 'message' as we need to keep 'completion'
     update_data.pop("message", None)
     # Keep the completion status from the AI response
-    updated_params = current_params.copy(update=update_data)
-    return updated_params
+    merged = {**current_params.dict(exclude_none=True), **update_data}
+    return FlightParams(**{key: value for key, value in merged.items() if value is not None})
+
+
+# Reply when the model's update fails validation; the previous parameters are kept
+INVALID_UPDATE_MESSAGE = (
+    "Sorry, I couldn't use some of those details. Could you give them again? "
+    "Airports need to be 3-letter codes like CDG and dates in YYYY-MM-DD format."
+)
+
+
+def load_parameters(data: Dict[str, Any]) -> FlightParams:
+    """
+    FlightParams from saved session state.
+
+    Fields that fail validation (e.g. saved before updates were validated)
+    are dropped and the parameters marked incomplete, so one bad value
+    doesn't make the whole session unloadable.
+    """
+    try:
+        return FlightParams(**data)
+    except ValidationError as e:
+        invalid = {error["loc"][0] for error in e.errors() if error["loc"]}
+        print(f"Debug: Dropping invalid saved parameters {sorted(invalid)}: {str(e)}")
+        valid = {key: value for key, value in data.items() if key not in invalid}
+        valid["completion"] = False
+        try:
+            return FlightParams(**valid)
+        except ValidationError:
+            return FlightParams()
 
 
 def get_next_message(params: FlightParams, ai_response: AIResponse) -> Optional[str]:
@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import web
+from pydantic import BaseModel, Field, ValidationError
+
+from ai_utils import INVALID_UPDATE_MESSAGE, get_model_response, load_parameters, update_parameters
+from cache_warmer import CacheWarmer, create_cache_warmer
+from search_cache import (
+    CircuitOpenError, RESET_TIMEOUT, search_history, search_outbound_flights, search_return_flights, get_booking_url,
+)
+from models import AIResponse, FlightParams, MultiCityParams
+from multi_city import DEFAULT_ITINERARIES, search_multi_city
+from session_store import SessionStore, create_session_store
+
+# Blocking OpenAI/SerpAPI calls run on this many threads, shared by all sessions
+DEFAULT_WORKERS = 32
+# Turns for one session are serialized through one of this many locks
+SESSION_LOCK_STRIPES = 64
+
+STORE_KEY = web.AppKey("store", SessionStore)
+LOCKS_KEY = web.AppKey("locks", list)
+EXECUTOR_KEY = web.AppKey("executor", ThreadPoolExecutor)
+WARMER_KEY = web.AppKey("warmer", CacheWarmer)
+
+
+class ChatTurn(BaseModel):
+    message: str = Field(..., min_length=1)
+
+
+class ReturnSearchRequest(BaseModel):
+    departure_token: str = Field(..., min_length=1)
+
+
+class BookingUrlRequest(BaseModel):
+    booking_token: str = Field(..., min_length=1)
+
+
+class Session:
+    """Conversation state for one client, as loaded from the session store."""
+
+    def __init__(self, session_id: Optional[str] = None, state: Optional[Dict[str, Any]] = None):
+        # Keep keys the API doesn't use (e.g. saved by the Streamlit UI) so saving doesn't drop them
+        self.state = state or {}
+        self.id = session_id or uuid.uuid4().hex
+        self.messages: List[Dict[str, str]] = self.state.get("messages", [])
+        self.flight_params = load_parameters(self.state.get("flight_params", {}))
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            **self.state,
+            "messages": self.messages,
+            "flight_params": self.flight_params.dict(exclude_none=True),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "messages": self.messages,
+            "flight_params": self.flight_params.dict(exclude_none=True),
+        }
+
+
+async def run_blocking(request: web.Request, func: Callable, **kwargs) -> Any:
+    """Run a blocking call on the shared worker pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(request.app[EXECUTOR_KEY], partial(func, **kwargs))
+
+
+def json_error(error_class: type, message: str) -> web.HTTPException:
+    """Build an aiohttp HTTP error with a JSON body."""
+    return error_class(text=json.dumps({"error": message}), content_type="application/json")
+
+
+def upstream_error(e: RuntimeError) -> web.HTTPException:
+    """503 while the SerpAPI circuit is open, so clients back off; 502 for other upstream failures."""
+    if isinstance(e, CircuitOpenError):
+        error = json_error(web.HTTPServiceUnavailable, str(e))
+        error.headers["Retry-After"] = str(RESET_TIMEOUT)
+        return error
+    return json_error(web.HTTPBadGateway, str(e))
+
+
+async def parse_body(request: web.Request, model: type) -> BaseModel:
+    try:
+        return model(**await request.json())
+    except (ValueError, TypeError) as e:  # Bad JSON, non-object body or ValidationError
+        raise json_error(web.HTTPBadRequest, str(e)) from e
+
+
+async def get_session(request: web.Request) -> Session:
+    session_id = request.match_info["session_id"]
+    state = await run_blocking(request, request.app[STORE_KEY].load, session_id=session_id)
+    if state is None:
+        raise json_error(web.HTTPNotFound, "Unknown session")
+    return Session(session_id, state)
+
+
+async def save_session(request: web.Request, session: Session) -> None:
+    await run_blocking(request, request.app[STORE_KEY].save, session_id=session.id, state=session.to_state())
+
+
+def session_lock(request: web.Request) -> asyncio.Lock:
+    """Lock serializing turns for one session, so concurrent requests don't overwrite each other."""
+    locks = request.app[LOCKS_KEY]
+    return locks[hash(request.match_info["session_id"]) % len(locks)]
+
+
+def require_search_params(params: FlightParams) -> None:
+    if not params.completion:
+        raise json_error(web.HTTPConflict, "Flight parameters are not complete yet")
+
+
+async def create_session(request: web.Request) -> web.Response:
+    session = Session()
+    await save_session(request, session)
+    return web.json_response(session.to_dict(), status=201)
+
+
+async def read_session(request: web.Request) -> web.Response:
+    return web.json_response((await get_session(request)).to_dict())
+
+
+async def delete_session(request: web.Request) -> web.Response:
+    session = await get_session(request)
+    await run_blocking(request, request.app[STORE_KEY].delete, session_id=session.id)
+    return web.Response(status=204)
+
+
+async def chat_turn(request: web.Request) -> web.Response:
+    """Run one conversation turn and return the assistant reply."""
+    turn = await parse_body(request, ChatTurn)
+
+    async with session_lock(request):
+        session = await get_session(request)
+        ai_response = await run_blocking(
+            request,
+            get_model_response,
+            prompt=turn.message,
+            current_params=session.flight_params,
+        )
+        try:
+            session.flight_params = update_parameters(session.flight_params, ai_response)
+        except ValidationError as e:
+            # Keep the last valid parameters and ask the user again
+            print(f"Debug: Rejected invalid parameter update: {str(e)}")
+            ai_response = AIResponse(message=INVALID_UPDATE_MESSAGE)
+
+        session.messages.append({"role": "user", "content": turn.message})
+        if ai_response.message:
+            session.messages.append({"role": "assistant", "content": ai_response.message})
+        await save_session(request, session)
+
+    return web.json_response({
+        "message": ai_response.message,
+        "completion": session.flight_params.completion,
+        "flight_params": session.flight_params.dict(exclude_none=True),
+    })
+
+
+async def outbound_search(request: web.Request) -> web.Response:
+    session = await get_session(request)
+    params = session.flight_params
+    require_search_params(params)
+
+    try:
+        result = await run_blocking(
+            request,
+            search_outbound_flights.lookup,
+            departure_id=params.departure_id,
+            arrival_id=params.arrival_id,
+            outbound_date=params.outbound_date,
+            return_date=params.return_date or params.outbound_date,  # Use outbound_date as return_date for one-way
+            adults=params.adults,
+            travel_class=params.travel_class,
+            outbound_times=params.outbound_times,
+        )
+    except RuntimeError as e:
+        raise upstream_error(e) from e
+
+    return web.json_response({
+        "trip_type": params.trip_type,
+        "flights": result.value,
+        "stale": result.stale,
+        "age_seconds": round(result.age),
+    })
+
+
+async def return_search(request: web.Request) -> web.Response:
+    session = await get_session(request)
+    params = session.flight_params
+    require_search_params(params)
+    body = await parse_body(request, ReturnSearchRequest)
+
+    try:
+        result = await run_blocking(
+            request,
+            search_return_flights.lookup,
+            departure_id=params.departure_id,
+            arrival_id=params.arrival_id,
+            outbound_date=params.outbound_date,
+            return_date=params.return_date,
+            departure_token=body.departure_token,
+            adults=params.adults,
+            travel_class=params.travel_class,
+            return_times=params.return_times,
+        )
+    except RuntimeError as e:
+        raise upstream_error(e) from e
+
+    return web.json_response({"flights": result.value, "stale": result.stale, "age_seconds": round(result.age)})
+
+
+async def booking_url(request: web.Request) -> web.Response:
+    session = await get_session(request)
+    params = session.flight_params
+    require_search_params(params)
+    body = await parse_body(request, BookingUrlRequest)
+
+    try:
+        url = await run_blocking(
+            request,
+            get_booking_url,
+            departure_id=params.departure_id,
+            arrival_id=params.arrival_id,
+            outbound_date=params.outbound_date,
+            return_date=params.return_date,
+            trip_type=params.trip_type,
+            booking_token=body.booking_token,
+        )
+    except RuntimeError as e:
+        raise upstream_error(e) from e
+
+    return web.json_response({"booking_url": url})
+
+
+async def multi_city_search(request: web.Request) -> web.Response:
+    """Rank multi-city itineraries. Takes MultiCityParams as the body and an optional ?k= limit."""
+    params = await parse_body(request, MultiCityParams)
+    try:
+        k = int(request.query.get("k", DEFAULT_ITINERARIES))
+    except ValueError as e:
+        raise json_error(web.HTTPBadRequest, "k must be an integer") from e
+
+    try:
+        itineraries = await run_blocking(request, search_multi_city, params=params, k=k)
+    except RuntimeError as e:
+        raise upstream_error(e) from e
+
+    return web.json_response({"itineraries": itineraries})
+
+
+async def cache_stats(request: web.Request) -> web.Response:
+    """Share of outbound searches served warm, and what the cache warmer has done."""
+    warmer = request.app[WARMER_KEY]
+    return web.json_response(warmer.report() if warmer else search_history.report())
+
+
+def create_app(workers: int = DEFAULT_WORKERS, store: Optional[SessionStore] = None) -> web.Application:
+    """Build the HTTP app. Every session shares one worker pool, HTTP pools and caches."""
+    app = web.Application()
+    app[STORE_KEY] = store or create_session_store()
+    app[LOCKS_KEY] = [asyncio.Lock() for _ in range(SESSION_LOCK_STRIPES)]
+    app[EXECUTOR_KEY] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tailwind-api")
+    app[WARMER_KEY] = create_cache_warmer()
+
+    async def start_warmer(app: web.Application) -> None:
+        if app[WARMER_KEY]:
+            app[WARMER_KEY].start()
+
+    async def shutdown(app: web.Application) -> None:
+        if app[WARMER_KEY]:
+            app[WARMER_KEY].stop()
+        app[EXECUTOR_KEY].shutdown(wait=False)
+
+    app.on_startup.append(start_warmer)
+    app.on_cleanup.append(shutdown)
+    app.add_routes([
+        web.post("/sessions", create_session),
+        web.get("/sessions/{session_id}", read_session),
+        web.delete("/sessions/{session_id}", delete_session),
+        web.post("/sessions/{session_id}/messages", chat_turn),
+        web.post("/sessions/{session_id}/search/outbound", outbound_search),
+        web.post("/sessions/{session_id}/search/return", return_search),
+        web.post("/sessions/{session_id}/booking-url", booking_url),
+        web.post("/search/multi-city", multi_city_search),
+        web.get("/stats/cache", cache_stats),
+    ])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tailwind booking HTTP API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Threads for blocking OpenAI/SerpAPI calls")
+    args = parser.parse_args()
+    web.run_app(create_app(args.workers), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from ai_utils import fetch_model_response, update_parameters
+# Fresh searches: a batch result is read later, so it shouldn't start out with stale fares
+from search_cache import CircuitOpenError, RESET_TIMEOUT, search_outbound_flights_fresh, search_return_flights_fresh
+from models import FlightParams
+
+DEFAULT_WORKERS = 8
+PENDING_PER_WORKER = 4  # Bound on queued requests so huge inputs aren't loaded at once
+# Times a search waits out an open SerpAPI circuit before its request is recorded as an error
+CIRCUIT_RETRIES = 10
+
+
+def read_requests(path: str) -> Iterator[Tuple[str, Dict[str, Any], Optional[str]]]:
+    """
+    Yield (request id, record, error) from a JSONL file. Lines without an id use their line number.
+
+    A line that isn't a JSON object is yielded with an empty record and an
+    error, so one bad line doesn't stop the run.
+    """
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield str(line_number), {}, f"Invalid JSON on line {line_number}: {str(e)}"
+                continue
+            if not isinstance(record, dict):
+                yield str(line_number), {}, f"Line {line_number} is not a JSON object"
+                continue
+            yield str(record.get("id", line_number)), record, None
+
+
+def load_checkpoint(path: str, retry_errors: bool = False) -> Set[str]:
+    """Return the ids already written to the output file by a previous run."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partial last line from a crashed run
+            if retry_errors and result.get("status") == "error":
+                done.discard(result["id"])
+            else:
+                done.add(result["id"])
+    return done
+
+
+def search_when_available(search, **kwargs) -> Any:
+    """
+    Run a cached search, waiting RESET_TIMEOUT and retrying while the SerpAPI circuit is open.
+
+    The batch shares the circuit breaker with the UI and API, so without this
+    a short outage would fail every request still queued.
+    """
+    for attempt in range(CIRCUIT_RETRIES + 1):
+        try:
+            return search(**kwargs)
+        except CircuitOpenError:
+            if attempt == CIRCUIT_RETRIES:
+                raise
+            print(f"Debug: SerpAPI circuit is open, retrying in {RESET_TIMEOUT}s")
+            time.sleep(RESET_TIMEOUT)
+
+
+def process_request(request_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract parameters for one request and run its flight searches."""
+    result = {"id": request_id, "status": "ok"}
+    try:
+        params = FlightParams(**record.get("params", {}))
+        prompt = record.get("request")
+        if prompt:
+            # Raises on OpenAI failures, so the request is recorded as an error and
+            # can be retried, rather than searched with fallback parameters
+            ai_response = fetch_model_response(prompt, params)
+            params = update_parameters(params, ai_response)
+            result["message"] = ai_response.message
+        result["flight_params"] = params.dict(exclude_none=True)
+
+        if not params.is_searchable():
+            result["status"] = "incomplete"
+            return result
+
+        outbound_flights = search_when_available(
+            search_outbound_flights_fresh,
+            departure_id=params.departure_id,
+            arrival_id=params.arrival_id,
+            outbound_date=params.outbound_date,
+            return_date=params.return_date or params.outbound_date,  # Use outbound_date as return_date for one-way
+            adults=params.adults,
+            travel_class=params.travel_class,
+            outbound_times=params.outbound_times,
+        )
+        result["outbound_flights"] = outbound_flights
+
+        # Quote the return leg for the best outbound option on round trips
+        if params.trip_type != 2:
+            best = next((f for f in outbound_flights if "departure_token" in f), None)
+            result["return_flights"] = search_when_available(
+                search_return_flights_fresh,
+                departure_id=params.departure_id,
+                arrival_id=params.arrival_id,
+                outbound_date=params.outbound_date,
+                return_date=params.return_date,
+                departure_token=best["departure_token"],
+                adults=params.adults,
+                travel_class=params.travel_class,
+                return_times=params.return_times,
+            ) if best else []
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    return result
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    workers: int = DEFAULT_WORKERS,
+    retry_errors: bool = False,
+) -> Dict[str, int]:
+    """
+    Process every request in input_path that isn't already in output_path.
+
+    Results are appended to output_path as each request finishes, so the
+    output file doubles as the checkpoint for resuming a crashed run.
+
+    Returns:
+        Count of results written per status
+    """
+    done = load_checkpoint(output_path, retry_errors)
+    counts = {"ok": 0, "incomplete": 0, "error": 0, "skipped": 0}
+    pending: Dict[Future, str] = {}
+
+    def write_result(result: Dict[str, Any]) -> None:
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+        counts[result["status"]] += 1
+        print(f"{result['id']}: {result['status']}")
+
+    def write_finished(futures) -> None:
+        for future in futures:
+            pending.pop(future)
+            write_result(future.result())
+
+    with open(output_path, "a+") as out, ThreadPoolExecutor(max_workers=workers) as executor:
+        # Terminate a line cut short by a crash so the next result starts cleanly
+        if out.tell():
+            out.seek(out.tell() - 1)
+            if out.read(1) != "\n":
+                out.write("\n")
+        for request_id, record, error in read_requests(input_path):
+            if request_id in done:
+                counts["skipped"] += 1
+                continue
+            if error:
+                write_result({"id": request_id, "status": "error", "error": error})
+                continue
+            if len(pending) >= workers * PENDING_PER_WORKER:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                write_finished(finished)
+            pending[executor.submit(process_request, request_id, record)] = request_id
+
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            write_finished(finished)
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run natural-language flight searches from a JSONL file in parallel."
+    )
+    parser.add_argument("input", help="JSONL with 'request' text and/or partial 'params' per line")
+    parser.add_argument("output", help="JSONL results file, also used to resume interrupted runs")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--retry-errors", action="store_true",
+                        help="Re-run requests that previously finished with an error")
+    args = parser.parse_args()
+
+    counts = run_batch(args.input, args.output, args.workers, args.retry_errors)
+    print(", ".join(f"{status}: {count}" for status, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+MODULES = ["models", "ai_utils", "booking_function", "search_cache", "batch_search", "api", "streamlit_app"]
+# Dependencies that dominate cold start and should only load when actually used
+HEAVY_DEPENDENCIES = ["openai", "streamlit", "serpapi", "requests", "dotenv", "pytz"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(module: str, runs: int) -> Dict[str, object]:
+    """Import a module in fresh interpreters and return the median import time."""
+    samples: List[float] = []
+    loaded: List[str] = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_DEPENDENCIES)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        loaded = result["loaded"]
+    return {"median_ms": statistics.median(samples) * 1000, "heavy_loaded": loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of the app's modules.")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--max-ms", type=float, help="Fail if any module's median import exceeds this")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        result = time_import(module, args.runs)
+        heavy = ", ".join(result["heavy_loaded"]) or "none"
+        print(f"{module:<18} {result['median_ms']:8.1f} ms   heavy deps loaded: {heavy}")
+        if args.max_ms is not None and result["median_ms"] > args.max_ms:
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,150 @@
 from typing import List, Dict, Any, Optional, Tuple, Union
-from serpapi import GoogleSearch
 from datetime import datetime
+from functools import lru_cache
 import os
-from dotenv import load_dotenv
-import streamlit as st
-
-load_dotenv()
 
 # Configuration constants
 MAX_FLIGHTS_TO_RETURN = 5
 SKYTEAM_AIRLINES = "SKYTEAM"
 
+SERPAPI_POOL_SIZE = 32  # Keep-alive connections shared by all sessions in the process
+SERPAPI_TIMEOUT = 30  # Seconds; a hung SerpAPI call counts as a failure instead of blocking a worker
+# SerpAPI answers a search with no flights with this error; that is a real, empty result
+SERPAPI_NO_RESULTS = "hasn't returned any results"
+
 FlightResult = Union[List[Dict[str, Any]], List[Tuple[Dict[str, Any], Dict[str, Any]]]]
 
-# Add caching for outbound flights search
-@st.cache_data(ttl=3600)  # Cache for 1 hour
+# This module is deliberately uncached and free of Streamlit so the CLI, API
+# and workers don't pay for it at import. Callers add their own caching layer.
+
+
+class SerpAPIError(RuntimeError):
+    """
+    SerpAPI could not be reached or answered with an error.
+
+    transient is True for failures of SerpAPI itself (connection errors,
+    timeouts, 5xx and 429) rather than of the request that was sent.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, transient: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.transient = transient
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """True if error, or an exception it was raised from, is a transient SerpAPIError."""
+    while error is not None:
+        if isinstance(error, SerpAPIError):
+            return error.transient
+        error = error.__cause__
+    return False
+
+
+@lru_cache(maxsize=None)
+def load_env() -> None:
+    """Load .env once, on the first search rather than at import."""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+
+def get_api_key() -> str:
+    load_env()
+    api_key = os.getenv("SERPAPI_API_KEY")
+    if not api_key:
+        raise ValueError("SERPAPI_API_KEY not found in environment variables")
+    return api_key
+
+
+@lru_cache(maxsize=None)
+def get_search_class():
+    """
+    Build the GoogleSearch subclass used for every SerpAPI call.
+
+    serpapi and requests are imported here, on first use. All searches in the
+    process share one requests.Session so concurrent callers reuse connections.
+    SERPAPI_BACKEND overrides the SerpAPI base URL (e.g. for load tests).
+    Transport failures and non-2xx replies raise SerpAPIError.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from serpapi import GoogleSearch
+
+    http_session = requests.Session()
+    http_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=SERPAPI_POOL_SIZE))
+    http_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=SERPAPI_POOL_SIZE))
+
+    class PooledGoogleSearch(GoogleSearch):
+        """GoogleSearch that sends requests through the shared connection pool."""
+
+        BACKEND = os.getenv("SERPAPI_BACKEND", GoogleSearch.BACKEND)
+
+        def get_response(self, path: str = "/search"):
+            url, parameter = self.construct_url(path)
+            try:
+                # GoogleSearch's default timeout of 60000 is passed to requests as seconds
+                response = http_session.get(url, params=parameter, timeout=SERPAPI_TIMEOUT)
+            except requests.RequestException as e:
+                raise SerpAPIError(f"SerpAPI request failed: {str(e)}", transient=True) from e
+            if not response.ok:
+                try:
+                    message = response.json().get("error", response.reason)
+                except (ValueError, AttributeError):
+                    message = response.reason
+                raise SerpAPIError(
+                    f"SerpAPI returned {response.status_code}: {message}",
+                    status=response.status_code,
+                    transient=response.status_code == 429 or response.status_code >= 500,
+                )
+            return response
+
+    return PooledGoogleSearch
+
+
+def get_results(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a SerpAPI search, raising SerpAPIError if the reply is an error."""
+    results = get_search_class()(params).get_dict()
+    error = results.get("error")
+    if error and SERPAPI_NO_RESULTS not in error:
+        raise SerpAPIError(f"SerpAPI error: {error}")
+    return results
+
+
 def search_outbound_flights(
     departure_id: str,
     arrival_id: str,
     outbound_date: str,
-    return_date: str,  # Required for SerpAPI
+    return_date: Optional[str],  # Required for SerpAPI round trips
     adults: int = 1,
     travel_class: int = 1,
     outbound_times: Optional[str] = None,
+    max_results: Optional[int] = None,
+    trip_type: int = 1,
 ) -> List[Dict[str, Any]]:
-    """Search for outbound flights with caching."""
-    api_key = os.getenv("SERPAPI_API_KEY")
-    if not api_key:
-        raise ValueError("SERPAPI_API_KEY not found in environment variables")
+    """
+    Search for outbound flights.
+
+    By default returns the top MAX_FLIGHTS_TO_RETURN best flights. Passing
+    max_results widens the result to best flights followed by SerpAPI's
+    other flights, up to that many. trip_type=2 searches one-way fares, so
+    prices are for this flight alone and return_date is ignored.
+    """
+    api_key = get_api_key()
         
     params = {
         "engine": "google_flights",
         "departure_id": departure_id.upper(),
         "arrival_id": arrival_id.upper(),
         "outbound_date": outbound_date,
-        "return_date": return_date,  # Always required
         "hl": "en",
         "adults": adults,
         "travel_class": travel_class,
         "include_airlines": SKYTEAM_AIRLINES,
         "api_key": api_key,
-        "type": "1"
+        "type": "2" if trip_type == 2 else "1"
     }
+    if trip_type != 2:
+        params["return_date"] = return_date
     
     if outbound_times:
         params["outbound_times"] = outbound_times
@@ -49,16 +152,15 @@ def search_outbound_flights(
     print(f"Debug: Outbound search params: {params}")
     
     try:
-        search = GoogleSearch(params)
-        results = search.get_dict()
+        results = get_results(params)
         best_flights = results.get("best_flights", [])
-        return best_flights[:MAX_FLIGHTS_TO_RETURN]
+        if max_results is None:
+            return best_flights[:MAX_FLIGHTS_TO_RETURN]
+        return (best_flights + results.get("other_flights", []))[:max_results]
     except Exception as e:
         print(f"Debug: Search failed with error: {str(e)}")
         raise RuntimeError(f"Outbound flight search failed: {str(e)}") from e
 
-# Add caching for return flights search
-@st.cache_data(ttl=3600)  # Cache for 1 hour
 def search_return_flights(
     departure_id: str,
     arrival_id: str,
@@ -69,10 +171,8 @@ def search_return_flights(
     travel_class: int = 1,
     return_times: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
-    """Search for return flights with caching."""
-    api_key = os.getenv("SERPAPI_API_KEY")
-    if not api_key:
-        raise ValueError("SERPAPI_API_KEY not found in environment variables")
+    """Search for return flights."""
+    api_key = get_api_key()
     params = {
         "engine": "google_flights",
         "departure_id": departure_id.upper(),
@@ -95,15 +195,13 @@ def search_return_flights(
     print(f"Debug: Return search params: {params}")
     
     try:
-        search = GoogleSearch(params)
-        results = search.get_dict()
+        results = get_results(params)
         return_flights = results.get("best_flights", [])
         return return_flights[:MAX_FLIGHTS_TO_RETURN]
     except Exception as e:
         print(f"Debug: Return search failed with error: {str(e)}")
         raise RuntimeError(f"Return flight search failed: {str(e)}") from e
 
-@st.cache_data(ttl=3600)  # Cache for 1 hour
 def get_booking_url(
     departure_id: str,
     arrival_id: str,
@@ -113,9 +211,7 @@ def get_booking_url(
     booking_token: str,
 ) -> str:
     """Get the Google Flights booking URL for the selected flight."""
-    api_key = os.getenv("SERPAPI_API_KEY")
-    if not api_key:
-        raise ValueError("SERPAPI_API_KEY not found in environment variables")
+    api_key = get_api_key()
         
     params = {
         "engine": "google_flights",
@@ -133,8 +229,7 @@ def get_booking_url(
         params["return_date"] = return_date 
     
     try:
-        search = GoogleSearch(params)
-        results = search.get_dict()
+        results = get_results(params)
         booking_url = results["search_metadata"]["google_flights_url"]
         return booking_url
     except Exception as e:
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import date
+from typing import Any, Callable, Dict, Optional
+
+from search_cache import SearchHistory, search_cache, search_history, search_outbound_flights, serpapi_breaker
+
+# SerpAPI calls the warmer may spend per hour; CACHE_WARM_BUDGET overrides, 0 disables warming
+DEFAULT_BUDGET_PER_HOUR = 60
+# How many of the most popular searches are kept warm
+DEFAULT_TOP_SEARCHES = 50
+# Popular entries are refreshed when they are this close to going stale
+REFRESH_LEAD = 10 * 60
+WARM_INTERVAL = 60
+# The warmer backs off while this many user searches are waiting on SerpAPI
+BUSY_IN_FLIGHT = 8
+
+
+class CacheWarmer:
+    """
+    Keeps the most popular outbound searches cached ahead of expiry.
+
+    Runs on one background thread, refreshing one search at a time, so it
+    never competes with users for more than a single SerpAPI connection.
+    It stops for the cycle when it runs out of hourly budget, when user
+    searches are queueing, or when the SerpAPI circuit is not closed.
+    """
+
+    def __init__(
+        self,
+        search: Callable = search_outbound_flights,
+        history: SearchHistory = search_history,
+        budget_per_hour: int = DEFAULT_BUDGET_PER_HOUR,
+        top_searches: int = DEFAULT_TOP_SEARCHES,
+        lead_time: float = REFRESH_LEAD,
+        interval: float = WARM_INTERVAL,
+    ):
+        self.search = search
+        self.history = history
+        self.budget_per_hour = budget_per_hour
+        self.top_searches = top_searches
+        self.lead_time = lead_time
+        self.interval = interval
+        self._spent: deque = deque()  # Times of refreshes in the last hour
+        self._spent_lock = threading.Lock()
+        self._refreshed = 0
+        self._failed = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def budget_left(self, now: float) -> int:
+        with self._spent_lock:
+            while self._spent and now - self._spent[0] > 3600:
+                self._spent.popleft()
+            return self.budget_per_hour - len(self._spent)
+
+    def _spend(self) -> None:
+        with self._spent_lock:
+            self._spent.append(time.time())
+
+    def busy(self) -> bool:
+        return serpapi_breaker.state != "closed" or search_cache.in_flight() >= BUSY_IN_FLIGHT
+
+    def run_once(self) -> int:
+        """Refresh popular searches that are uncached or close to going stale. Returns how many."""
+        refreshed = 0
+        today = date.today().isoformat()
+        for kwargs in self.history.popular(self.top_searches):
+            if self.budget_left(time.time()) <= 0 or self.busy():
+                break
+            if kwargs["outbound_date"] < today:
+                continue  # Departed; it will decay out of the history
+            expires_in = self.search.expires_in(**kwargs)
+            if expires_in is not None and expires_in > self.lead_time:
+                continue
+            try:
+                if self.search.refresh(**kwargs):
+                    self._spend()
+                    refreshed += 1
+            except Exception as e:
+                self._spend()
+                self._failed += 1
+                print(f"Debug: Cache warming failed: {str(e)}")
+        self._refreshed += refreshed
+        return refreshed
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            **self.history.report(),
+            "warmer_refreshed": self._refreshed,
+            "warmer_failed": self._failed,
+            "warmer_budget_left": self.budget_left(time.time()),
+        }
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            if self.run_once():
+                report = self.report()
+                print(f"Debug: Cache warmer refreshed {report['warmer_refreshed']} searches so far; "
+                      f"{report['warm_share']:.0%} of searches served warm")
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="cache-warmer", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def create_cache_warmer() -> Optional[CacheWarmer]:
+    """A warmer for the shared search cache with the CACHE_WARM_BUDGET budget, or None if that is 0."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    budget = int(os.getenv("CACHE_WARM_BUDGET", DEFAULT_BUDGET_PER_HOUR))
+    if budget <= 0:
+        return None
+    return CacheWarmer(budget_per_hour=budget)
@@ -0,0 +1,249 @@
+import argparse
+import json
+import sqlite3
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from booking_function import search_outbound_flights
+from models import FlightParams
+
+DEFAULT_DB_PATH = "fare_watch.db"
+
+# Even the most volatile routes are checked at most hourly to bound SerpAPI credit use
+MIN_POLL_INTERVAL = 60 * 60
+MAX_POLL_INTERVAL = 24 * 60 * 60
+# Departures further out than this are polled at the slowest rate
+FAR_OUT_DAYS = 60
+# Number of recent checks used to measure how often a route changes
+VOLATILITY_WINDOW = 8
+# Price moves smaller than this are treated as noise
+MIN_PRICE_CHANGE = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    params TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    next_check_at REAL NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    watch_id INTEGER NOT NULL REFERENCES watches(id),
+    taken_at REAL NOT NULL,
+    itineraries TEXT NOT NULL,
+    changed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_by_watch ON snapshots (watch_id, taken_at);
+"""
+
+
+def connect(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def itinerary_key(flight: Dict[str, Any]) -> str:
+    """Identify an itinerary by its flight numbers and departure times."""
+    return "|".join(
+        f"{segment['flight_number']}@{segment['departure_airport']['time']}"
+        for segment in flight["flights"]
+    )
+
+
+def summarize_flights(flights: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Reduce search results to the itinerary -> price map stored in snapshots."""
+    return {itinerary_key(flight): flight.get("price") for flight in flights}
+
+
+def diff_snapshots(old: Dict[str, float], new: Dict[str, float]) -> List[Dict[str, Any]]:
+    """
+    Compare two snapshots and list the changes worth reporting.
+
+    Returns:
+        A list of change dicts with type 'price_drop', 'new' or 'removed'.
+    """
+    changes = []
+    for key, price in new.items():
+        if key not in old:
+            changes.append({"type": "new", "itinerary": key, "price": price})
+        elif price is not None and old[key] is not None and old[key] - price >= MIN_PRICE_CHANGE:
+            changes.append({"type": "price_drop", "itinerary": key, "old_price": old[key], "price": price})
+    for key, price in old.items():
+        if key not in new:
+            changes.append({"type": "removed", "itinerary": key, "price": price})
+    return changes
+
+
+def has_moved(old: Dict[str, float], new: Dict[str, float]) -> bool:
+    """Whether anything changed at all, including price rises, for volatility tracking."""
+    if old.keys() != new.keys():
+        return True
+    return any(
+        old[key] is not None and new[key] is not None and abs(old[key] - new[key]) >= MIN_PRICE_CHANGE
+        for key in new
+    )
+
+
+def next_poll_interval(volatility: float, outbound_date: str, now: float) -> float:
+    """
+    Pick the delay before the next check of a watch.
+
+    Far-off departures are checked at most daily and the ceiling shrinks as
+    departure gets closer. Within that ceiling, routes that changed on most
+    recent checks are polled near MIN_POLL_INTERVAL and stable ones near the
+    ceiling.
+    """
+    departure = datetime.strptime(outbound_date, "%Y-%m-%d").timestamp()
+    days_left = max(0.0, (departure - now) / 86400)
+    ceiling = max(MIN_POLL_INTERVAL, MAX_POLL_INTERVAL * min(1.0, days_left / FAR_OUT_DAYS))
+    return max(MIN_POLL_INTERVAL, ceiling * (1.0 - volatility))
+
+
+def route_volatility(conn: sqlite3.Connection, watch_id: int) -> float:
+    """Share of recent checks that saw any change. Unknown routes count as half volatile."""
+    # The first snapshot of a watch has nothing to compare against, so it is never a check
+    checks = conn.execute(
+        "SELECT changed FROM snapshots WHERE watch_id = ? AND id > "
+        "(SELECT MIN(id) FROM snapshots WHERE watch_id = ?) ORDER BY taken_at DESC LIMIT ?",
+        (watch_id, watch_id, VOLATILITY_WINDOW),
+    ).fetchall()
+    if not checks:
+        return 0.5
+    return sum(row["changed"] for row in checks) / len(checks)
+
+
+def add_watch(conn: sqlite3.Connection, params: FlightParams, now: Optional[float] = None) -> int:
+    """Save a search to be re-run on a schedule. It is first checked on the next run."""
+    if not params.is_searchable():
+        raise ValueError("A watch needs departure, arrival and travel dates")
+    now = now or time.time()
+    cursor = conn.execute(
+        "INSERT INTO watches (params, created_at, next_check_at) VALUES (?, ?, ?)",
+        (params.json(exclude_none=True), now, now),
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+
+def list_watches(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+    return conn.execute("SELECT * FROM watches WHERE active = 1 ORDER BY next_check_at").fetchall()
+
+
+def remove_watch(conn: sqlite3.Connection, watch_id: int) -> None:
+    conn.execute("UPDATE watches SET active = 0 WHERE id = ?", (watch_id,))
+    conn.commit()
+
+
+def check_watch(conn: sqlite3.Connection, watch: sqlite3.Row, now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Re-run one watched search, store the snapshot and schedule the next check.
+
+    Returns:
+        Changes since the previous snapshot (empty on the first check).
+    """
+    now = now or time.time()
+    params = FlightParams.parse_raw(watch["params"])
+
+    if datetime.strptime(params.outbound_date, "%Y-%m-%d").timestamp() + 86400 < now:
+        remove_watch(conn, watch["id"])  # Departure has passed
+        return []
+
+    flights = search_outbound_flights(
+        departure_id=params.departure_id,
+        arrival_id=params.arrival_id,
+        outbound_date=params.outbound_date,
+        return_date=params.return_date or params.outbound_date,  # Use outbound_date as return_date for one-way
+        adults=params.adults,
+        travel_class=params.travel_class,
+        outbound_times=params.outbound_times,
+    )
+    snapshot = summarize_flights(flights)
+
+    previous = conn.execute(
+        "SELECT itineraries FROM snapshots WHERE watch_id = ? ORDER BY taken_at DESC LIMIT 1",
+        (watch["id"],),
+    ).fetchone()
+    if previous is None:
+        changes, moved = [], False
+    else:
+        old = json.loads(previous["itineraries"])
+        changes, moved = diff_snapshots(old, snapshot), has_moved(old, snapshot)
+
+    conn.execute(
+        "INSERT INTO snapshots (watch_id, taken_at, itineraries, changed) VALUES (?, ?, ?, ?)",
+        (watch["id"], now, json.dumps(snapshot), int(moved)),
+    )
+    interval = next_poll_interval(route_volatility(conn, watch["id"]), params.outbound_date, now)
+    conn.execute("UPDATE watches SET next_check_at = ? WHERE id = ?", (now + interval, watch["id"]))
+    conn.commit()
+    return changes
+
+
+def run_due_watches(conn: sqlite3.Connection, now: Optional[float] = None) -> Dict[int, List[Dict[str, Any]]]:
+    """Check every watch whose next check time has passed."""
+    now = now or time.time()
+    due = conn.execute(
+        "SELECT * FROM watches WHERE active = 1 AND next_check_at <= ? ORDER BY next_check_at",
+        (now,),
+    ).fetchall()
+
+    results = {}
+    for watch in due:
+        try:
+            results[watch["id"]] = check_watch(conn, watch, now)
+        except Exception as e:
+            # Retry failed searches at the minimum interval instead of on every run
+            print(f"Error checking watch {watch['id']}: {str(e)}")
+            conn.execute("UPDATE watches SET next_check_at = ? WHERE id = ?", (now + MIN_POLL_INTERVAL, watch["id"]))
+            conn.commit()
+    return results
+
+
+def print_changes(watch_id: int, changes: List[Dict[str, Any]]) -> None:
+    for change in changes:
+        if change["type"] == "price_drop":
+            print(f"Watch {watch_id}: price drop {change['old_price']} -> {change['price']} on {change['itinerary']}")
+        else:
+            print(f"Watch {watch_id}: {change['type']} itinerary {change['itinerary']} at {change['price']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch saved flight searches for fare changes.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="Save a search to watch")
+    add_parser.add_argument("params", help="FlightParams as JSON")
+    subparsers.add_parser("list", help="Show active watches")
+    remove_parser = subparsers.add_parser("remove", help="Stop watching a search")
+    remove_parser.add_argument("watch_id", type=int)
+    run_parser = subparsers.add_parser("run", help="Check watches that are due")
+    run_parser.add_argument("--forever", action="store_true", help="Keep checking as watches fall due")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.command == "add":
+        watch_id = add_watch(conn, FlightParams(**json.loads(args.params)))
+        print(f"Added watch {watch_id}")
+    elif args.command == "list":
+        for watch in list_watches(conn):
+            next_check = datetime.fromtimestamp(watch["next_check_at"]).strftime("%Y-%m-%d %H:%M")
+            print(f"{watch['id']}: {watch['params']} (next check {next_check})")
+    elif args.command == "remove":
+        remove_watch(conn, args.watch_id)
+    else:
+        while True:
+            for watch_id, changes in run_due_watches(conn).items():
+                print_changes(watch_id, changes)
+            if not args.forever:
+                break
+            upcoming = conn.execute("SELECT MIN(next_check_at) FROM watches WHERE active = 1").fetchone()[0]
+            time.sleep(max(60, (upcoming or time.time() + MIN_POLL_INTERVAL) - time.time()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+STAGES = ["get_model_response", "update_parameters", "search_outbound_flights",
+          "search_return_flights", "get_booking_url"]
+ROUTES = [("ATL", "CDG"), ("JFK", "AMS"), ("DTW", "NRT"), ("MSP", "LHR"), ("SEA", "ICN"),
+          ("LAX", "CDG"), ("BOS", "FCO"), ("SLC", "MEX"), ("ATL", "LAX"), ("JFK", "MAD")]
+PROMPT_PATTERN = re.compile(r"from (\w{3}) to (\w{3}) on (\d{4}-\d{2}-\d{2})")
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Parse a latency distribution into a sampler returning seconds.
+
+    Formats (milliseconds): 'fixed:MS', 'uniform:LOW,HIGH', 'lognormal:MEDIAN,SIGMA'.
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal" and len(values) == 2:
+        return lambda: random.lognormvariate(math.log(values[0]), values[1]) / 1000
+    raise argparse.ArgumentTypeError(f"Invalid latency distribution: {spec}")
+
+
+def fake_flight(origin: str, destination: str, day: str, index: int) -> Dict[str, Any]:
+    """A SerpAPI-shaped itinerary with two segments."""
+    layover = ["AMS", "CDG", "DTW", "MSP"][index % 4]
+    segments = [
+        (origin, layover, f"{day} {6 + index}:00", f"{day} {9 + index}:30"),
+        (layover, destination, f"{day} {11 + index}:00", f"{day} {15 + index}:45"),
+    ]
+    return {
+        "flights": [
+            {
+                "departure_airport": {"name": f"{dep} Airport", "id": dep, "time": dep_time},
+                "arrival_airport": {"name": f"{arr} Airport", "id": arr, "time": arr_time},
+                "duration": 210,
+                "airplane": "Airbus A330",
+                "airline": "Delta",
+                "flight_number": f"DL {100 + index * 10 + n}",
+                "travel_class": "Economy",
+                "legroom": "31 in",
+                "extensions": ["Wi-Fi for a fee", "In-seat power & USB outlets"],
+            }
+            for n, (dep, arr, dep_time, arr_time) in enumerate(segments)
+        ],
+        "layovers": [{"duration": 90, "name": f"{layover} Airport", "id": layover}],
+        "total_duration": 585,
+        "price": 800 + index * 75,
+        "type": "Round trip",
+        "departure_token": f"dep-{origin}-{destination}-{day}-{index}",
+        "booking_token": f"book-{origin}-{destination}-{day}-{index}",
+    }
+
+
+class FakeBackendHandler(BaseHTTPRequestHandler):
+    """Serves OpenAI chat completions and SerpAPI Google Flights searches."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real APIs
+    # Headers and body are flushed separately; without TCP_NODELAY, Nagle plus
+    # delayed ACKs add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.server.openai_latency())
+        user_input = body["messages"][-1]["content"].split("User input:", 1)[-1]
+        match = PROMPT_PATTERN.search(user_input)
+        done = "[done]" in user_input
+        content = {"completion": done, "message": None if done else "How many passengers?"}
+        if match:
+            outbound = date.fromisoformat(match.group(3))
+            content.update({
+                "departure_id": match.group(1),
+                "arrival_id": match.group(2),
+                "trip_type": 1,
+                "outbound_date": match.group(3),
+                "return_date": (outbound + timedelta(days=7)).isoformat(),
+            })
+        self.send_json({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(content)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 900, "completion_tokens": 60, "total_tokens": 960},
+        })
+
+    def do_GET(self):
+        query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        time.sleep(self.server.serpapi_latency())
+        metadata = {"id": "fake", "status": "Success", "google_flights_url": "https://www.google.com/travel/flights"}
+        if "booking_token" in query:
+            self.send_json({"search_metadata": metadata})
+            return
+        origin, destination = query["departure_id"], query["arrival_id"]
+        day = query["return_date"] if "departure_token" in query else query["outbound_date"]
+        if "departure_token" in query:
+            origin, destination = destination, origin
+        self.send_json({
+            "search_metadata": metadata,
+            "best_flights": [fake_flight(origin, destination, day, i) for i in range(3)],
+            "other_flights": [fake_flight(origin, destination, day, i) for i in range(3, 8)],
+        })
+
+
+def start_fake_backends(openai_latency: Callable[[], float], serpapi_latency: Callable[[], float]) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBackendHandler)
+    server.daemon_threads = True
+    server.openai_latency = openai_latency
+    server.serpapi_latency = serpapi_latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def point_clients_at(server: ThreadingHTTPServer) -> None:
+    """Route the app's OpenAI and SerpAPI calls to the fake backends. Must run before the first search."""
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+    os.environ["OPENAI_API_KEY"] = "fake-openai-key"
+    os.environ["SERPAPI_API_KEY"] = "fake-serpapi-key"
+    os.environ["SERPAPI_BACKEND"] = base_url
+
+
+class SessionCounter:
+    """Hands out unique route/date combinations so every session misses the search cache."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def next(self) -> int:
+        with self.lock:
+            self.count += 1
+            return self.count
+
+
+def simulate_session(session_number: int, turns: int, timings: Dict[str, List[float]]) -> Dict[str, Any]:
+    """
+    Run one booking conversation end to end.
+
+    Returns:
+        The state a UI session would hold afterwards (messages, params, flights).
+    """
+    from ai_utils import get_model_response, update_parameters
+    # The cached searches the UI and API use, so single-flight, the circuit breaker and
+    # search history are measured too; SessionCounter keeps every session a cache miss
+    from search_cache import search_outbound_flights, search_return_flights, get_booking_url
+    from models import FlightParams
+
+    def timed(stage: str, func: Callable, *args, **kwargs) -> Any:
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[stage].append(time.perf_counter() - start)
+
+    origin, destination = ROUTES[session_number % len(ROUTES)]
+    outbound_date = date.today() + timedelta(days=30 + session_number // len(ROUTES))
+    state = {"messages": [], "flight_params": FlightParams(), "flights": []}
+
+    for turn in range(turns):
+        prompt = f"I want to fly from {origin} to {destination} on {outbound_date.isoformat()}"
+        if turn == turns - 1:
+            prompt += " [done]"
+        state["messages"].append({"role": "user", "content": prompt})
+        ai_response = timed("get_model_response", get_model_response, prompt, state["flight_params"])
+        state["flight_params"] = timed("update_parameters", update_parameters, state["flight_params"], ai_response)
+        if ai_response.message:
+            state["messages"].append({"role": "assistant", "content": ai_response.message})
+
+    params = state["flight_params"]
+    outbound_flights = timed(
+        "search_outbound_flights", search_outbound_flights,
+        departure_id=params.departure_id,
+        arrival_id=params.arrival_id,
+        outbound_date=params.outbound_date,
+        return_date=params.return_date,
+        adults=params.adults,
+        travel_class=params.travel_class,
+        outbound_times=params.outbound_times,
+    )
+    outbound = outbound_flights[0]
+    return_flights = timed(
+        "search_return_flights", search_return_flights,
+        departure_id=params.departure_id,
+        arrival_id=params.arrival_id,
+        outbound_date=params.outbound_date,
+        return_date=params.return_date,
+        departure_token=outbound["departure_token"],
+        adults=params.adults,
+        travel_class=params.travel_class,
+        return_times=params.return_times,
+    )
+    state["flights"] = [(outbound, return_flight) for return_flight in return_flights]
+    state["booking_url"] = timed(
+        "get_booking_url", get_booking_url,
+        departure_id=params.departure_id,
+        arrival_id=params.arrival_id,
+        outbound_date=params.outbound_date,
+        return_date=params.return_date,
+        trip_type=params.trip_type,
+        booking_token=return_flights[0]["booking_token"],
+    )
+    return state
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def run_level(concurrency: int, sessions: int, turns: int, counter: SessionCounter) -> Dict[str, Any]:
+    """Run `sessions` conversations with `concurrency` in flight at once."""
+    timings = {stage: [] for stage in STAGES}
+    session_times, errors = [], []
+
+    def one_session(_):
+        start = time.perf_counter()
+        simulate_session(counter.next(), turns, timings)
+        session_times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(one_session, i) for i in range(sessions)]
+        for future in futures:
+            if future.exception() is not None:
+                errors.append(repr(future.exception()))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput": (sessions - len(errors)) / elapsed,
+        "session_p95_ms": percentile(session_times, 95) * 1000,
+        "stages": {
+            stage: {f"p{p}_ms": percentile(values, p) * 1000 for p in (50, 95, 99)}
+            for stage, values in timings.items()
+        },
+    }
+
+
+def measure_session_memory(sessions: int, turns: int, counter: SessionCounter) -> Dict[str, float]:
+    """Bytes allocated per session while it runs (peak) and retained by its state afterwards."""
+    timings = {stage: [] for stage in STAGES}
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        states = list(executor.map(lambda _: simulate_session(counter.next(), turns, timings), range(sessions)))
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del states
+    return {
+        "retained_bytes_per_session": (current - baseline) / sessions,
+        "peak_bytes_per_session": (peak - baseline) / sessions,
+    }
+
+
+def find_saturation(levels: List[Dict[str, Any]], min_gain: float) -> Optional[int]:
+    """
+    The last concurrency level whose throughput still grew by at least min_gain over the previous one.
+
+    None if throughput kept growing through the highest level tested, i.e.
+    saturation was not reached.
+    """
+    for previous, level in zip(levels, levels[1:]):
+        if level["errors"] or level["throughput"] < previous["throughput"] * (1 + min_gain):
+            return previous["concurrency"]
+    return None
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    for level in report["levels"]:
+        print(f"\nConcurrency {level['concurrency']}: {level['throughput']:.2f} sessions/s, "
+              f"{level['errors']} errors, session p95 {level['session_p95_ms']:.0f} ms")
+        for stage, stats in level["stages"].items():
+            print(f"  {stage:<24} p50 {stats['p50_ms']:8.1f}  p95 {stats['p95_ms']:8.1f}  p99 {stats['p99_ms']:8.1f} ms")
+    memory = report["memory"]
+    print(f"\nMemory per session: {memory['retained_bytes_per_session'] / 1024:.1f} KiB retained, "
+          f"{memory['peak_bytes_per_session'] / 1024:.1f} KiB peak")
+    if report["saturation_concurrency"] is None:
+        print("Saturation point: not reached within the levels tested")
+    else:
+        print(f"Saturation point: {report['saturation_concurrency']} concurrent sessions")
+
+
+def check_thresholds(report: Dict[str, Any], max_p95: Dict[str, float], min_saturation: Optional[int]) -> List[str]:
+    """Return a failure message for each CI threshold the run violated."""
+    failures = []
+    for level in report["levels"]:
+        if level["errors"]:
+            failures.append(f"{level['errors']} failed sessions at concurrency {level['concurrency']}: "
+                            f"{level['first_error']}")
+        for stage, limit in max_p95.items():
+            actual = level["stages"][stage]["p95_ms"]
+            if actual > limit:
+                failures.append(f"{stage} p95 {actual:.0f} ms > {limit:.0f} ms at concurrency {level['concurrency']}")
+    saturation = report["saturation_concurrency"]
+    if min_saturation and saturation is not None and saturation < min_saturation:
+        failures.append(f"saturated at {saturation} < {min_saturation} concurrent sessions")
+    return failures
+
+
+def parse_stage_limit(spec: str) -> tuple:
+    stage, _, limit = spec.partition("=")
+    if stage not in STAGES or not limit:
+        raise argparse.ArgumentTypeError(f"Expected STAGE=MS with STAGE in {', '.join(STAGES)}")
+    return stage, float(limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Drive concurrent booking conversations (model -> params -> outbound -> return -> "
+                    "booking URL) against fake OpenAI/SerpAPI backends and report throughput, "
+                    "per-stage latency, memory per session and the saturation point."
+    )
+    parser.add_argument("--levels", default="1,2,4,8,16,32",
+                        help="Comma-separated concurrency levels to ramp through")
+    parser.add_argument("--sessions-per-level", type=int, default=0,
+                        help="Sessions to run per level (default: 4x the concurrency, at least 8)")
+    parser.add_argument("--turns", type=int, default=3, help="Chat turns per conversation")
+    parser.add_argument("--openai-latency", type=parse_latency, default="lognormal:600,0.4")
+    parser.add_argument("--serpapi-latency", type=parse_latency, default="lognormal:1200,0.4")
+    parser.add_argument("--memory-sessions", type=int, default=20)
+    parser.add_argument("--saturation-gain", type=float, default=0.1,
+                        help="Minimum relative throughput gain for a level to count as unsaturated")
+    parser.add_argument("--max-p95", type=parse_stage_limit, action="append", default=[],
+                        metavar="STAGE=MS", help="Fail if a stage's p95 exceeds MS at any level")
+    parser.add_argument("--min-saturation", type=int, help="Fail if saturation happens below this concurrency")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    server = start_fake_backends(args.openai_latency, args.serpapi_latency)
+    point_clients_at(server)
+    counter = SessionCounter()
+    levels = [int(level) for level in args.levels.split(",")]
+
+    report = {"levels": []}
+    # The app logs every request to stdout; keep the report readable
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # Untimed warm-up so imports and client setup don't land in the first level's latencies
+        simulate_session(counter.next(), args.turns, {stage: [] for stage in STAGES})
+        for concurrency in levels:
+            sessions = args.sessions_per_level or max(8, concurrency * 4)
+            report["levels"].append(run_level(concurrency, sessions, args.turns, counter))
+        report["memory"] = measure_session_memory(args.memory_sessions, args.turns, counter)
+    report["saturation_concurrency"] = find_saturation(report["levels"], args.saturation_gain)
+    server.shutdown()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = check_thresholds(report, dict(args.max_p95), args.min_saturation)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
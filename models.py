@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field, validator
 from datetime import datetime
 
@@ -94,6 +94,82 @@ class FlightParams(BaseModel):
         except ValueError as e:
             raise ValueError(f"Invalid time format: {str(e)}")
 
+    def is_searchable(self) -> bool:
+        """Whether route, dates and trip type are filled in enough to run a search."""
+        if not (self.departure_id and self.arrival_id and self.outbound_date):
+            return False
+        return self.trip_type == 2 or bool(self.return_date)
+
+
+class FlightLeg(BaseModel):
+    departure_id: str = Field(
+        ...,
+        description="Airport code for departure (e.g., 'CDG')",
+        pattern="^[A-Z]{3}$"
+    )
+    arrival_id: str = Field(
+        ...,
+        description="Airport code for arrival (e.g., 'AUS')",
+        pattern="^[A-Z]{3}$"
+    )
+    outbound_date: str = Field(
+        ...,
+        description="Departure date in YYYY-MM-DD format",
+        pattern="^\d{4}-\d{2}-\d{2}$"
+    )
+    outbound_times: Optional[str] = Field(
+        None,
+        description="Comma-separated time ranges for this leg (e.g., '4,18,3,19')"
+    )
+    min_stay_hours: Optional[float] = Field(
+        None,
+        ge=0,
+        description="Minimum hours to spend at this leg's destination before the next leg"
+    )
+
+    @validator("departure_id", "arrival_id")
+    def airport_code_must_be_valid(cls, v):
+        return FlightParams.airport_code_must_be_valid(v)
+
+    @validator("outbound_date")
+    def date_must_be_valid(cls, v):
+        return FlightParams.date_must_be_valid(v)
+
+    @validator("outbound_times")
+    def validate_times(cls, v):
+        return FlightParams.validate_times(v)
+
+
+class MultiCityParams(BaseModel):
+    legs: List[FlightLeg] = Field(
+        ...,
+        min_length=2,
+        description="Legs in travel order, e.g. A->B, B->C, C->A"
+    )
+    adults: int = Field(
+        1,
+        ge=1,
+        description="Number of adult passengers"
+    )
+    travel_class: int = Field(
+        1,
+        ge=1,
+        le=4,
+        description="1=Economy, 2=Premium Economy, 3=Business, 4=First"
+    )
+    min_connection_minutes: int = Field(
+        90,
+        ge=0,
+        description="Minimum time between landing and the next leg's departure"
+    )
+
+    @validator("legs")
+    def legs_must_be_in_date_order(cls, v):
+        for previous, leg in zip(v, v[1:]):
+            if leg.outbound_date < previous.outbound_date:
+                raise ValueError("Legs must be in travel order.")
+        return v
+
 
 class AIResponse(BaseModel):
     departure_id: Optional[str] = None
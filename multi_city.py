@@ -0,0 +1,136 @@
+import heapq
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from models import FlightLeg, MultiCityParams
+from search_cache import search_outbound_flights
+
+OPTIONS_PER_LEG = 50
+DEFAULT_ITINERARIES = 10
+LEG_SEARCH_WORKERS = 16
+
+# Shared by all multi-city searches in the process
+_leg_executor = ThreadPoolExecutor(max_workers=LEG_SEARCH_WORKERS, thread_name_prefix="multi-city-leg")
+
+
+def parse_time(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d %H:%M")
+
+
+def leg_price(flight: Dict[str, Any]) -> float:
+    # Legs are searched as one-way trips, so this is the fare for the leg alone
+    return flight["price"]
+
+
+def search_leg(leg: FlightLeg, params: MultiCityParams) -> List[Dict[str, Any]]:
+    """Search one leg as a one-way trip, cheapest first. Options without a price are dropped."""
+    flights = search_outbound_flights(
+        departure_id=leg.departure_id,
+        arrival_id=leg.arrival_id,
+        outbound_date=leg.outbound_date,
+        return_date=None,
+        adults=params.adults,
+        travel_class=params.travel_class,
+        outbound_times=leg.outbound_times,
+        max_results=OPTIONS_PER_LEG,
+        trip_type=2,
+    )
+    return sorted((f for f in flights if f.get("price") is not None), key=leg_price)
+
+
+def compatible_pairs(
+    earlier: List[Dict[str, Any]],
+    later: List[Dict[str, Any]],
+    min_gap_minutes: float,
+) -> List[List[bool]]:
+    """compatible[i][j] is True when later[j] departs at least min_gap_minutes after earlier[i] lands."""
+    arrivals = [parse_time(f["flights"][-1]["arrival_airport"]["time"]) for f in earlier]
+    departures = [parse_time(f["flights"][0]["departure_airport"]["time"]) for f in later]
+    return [
+        [(departure - arrival).total_seconds() >= min_gap_minutes * 60 for departure in departures]
+        for arrival in arrivals
+    ]
+
+
+def k_best_itineraries(
+    options: List[List[Dict[str, Any]]],
+    gaps_minutes: List[float],
+    k: int = DEFAULT_ITINERARIES,
+) -> List[Dict[str, Any]]:
+    """
+    The k cheapest combinations of one option per leg that satisfy the gaps between legs.
+
+    Works backwards from the last leg to find, for every option, the cheapest
+    feasible way to finish the trip from it (its suffix cost). Partial
+    itineraries are then extended best-first, only to compatible options on
+    the next leg, ordered by price so far plus the suffix cost of their last
+    option. That bound is exact, so complete itineraries come off the heap
+    cheapest first and the result is the true k best; options that can't be
+    part of any feasible itinerary are never expanded.
+    """
+    if not options or any(not leg_options for leg_options in options):
+        return []
+
+    prices = [[leg_price(f) for f in leg_options] for leg_options in options]
+    compatible = [
+        compatible_pairs(options[i], options[i + 1], gaps_minutes[i])
+        for i in range(len(options) - 1)
+    ]
+
+    # suffix[i][a]: cheapest price of legs i..end starting with option a (inf if no feasible finish)
+    # next_options[i][a]: options on leg i + 1 that can follow option a with a feasible finish
+    suffix = [[] for _ in options]
+    suffix[-1] = list(prices[-1])
+    next_options = [[] for _ in options]
+    for leg in range(len(options) - 2, -1, -1):
+        for a, price in enumerate(prices[leg]):
+            followers = [b for b, ok in enumerate(compatible[leg][a]) if ok and suffix[leg + 1][b] < math.inf]
+            next_options[leg].append(followers)
+            suffix[leg].append(price + min((suffix[leg + 1][b] for b in followers), default=math.inf))
+
+    # Entries are (exact best total, -depth, price of the options so far, option indices so far).
+    # Deeper entries win ties so complete itineraries surface promptly.
+    heap: List[Tuple[float, int, float, Tuple[int, ...]]] = [
+        (cost, -1, prices[0][a], (a,)) for a, cost in enumerate(suffix[0]) if cost < math.inf
+    ]
+    heapq.heapify(heap)
+    itineraries = []
+
+    while heap and len(itineraries) < k:
+        _, _, price_so_far, indices = heapq.heappop(heap)
+        depth = len(indices)
+        if depth == len(options):
+            itineraries.append({
+                "total_price": price_so_far,
+                "legs": [options[leg][index] for leg, index in enumerate(indices)],
+            })
+            continue
+
+        for b in next_options[depth - 1][indices[-1]]:
+            heapq.heappush(heap, (
+                price_so_far + suffix[depth][b],
+                -(depth + 1),
+                price_so_far + prices[depth][b],
+                indices + (b,),
+            ))
+
+    return itineraries
+
+
+def search_multi_city(params: MultiCityParams, k: int = DEFAULT_ITINERARIES) -> List[Dict[str, Any]]:
+    """
+    Search every leg concurrently and return the k cheapest feasible itineraries.
+
+    Between consecutive legs the traveller needs at least the trip's minimum
+    connection time, or the leg's min_stay_hours if that is longer.
+    """
+    futures = [_leg_executor.submit(search_leg, leg, params) for leg in params.legs]
+    options = [future.result() for future in futures]
+
+    gaps_minutes = [
+        max(params.min_connection_minutes, (leg.min_stay_hours or 0) * 60)
+        for leg in params.legs[:-1]
+    ]
+    return k_best_itineraries(options, gaps_minutes, k)
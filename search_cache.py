@@ -0,0 +1,332 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional
+
+import booking_function
+
+DEFAULT_TTL = 3600  # Cache for 1 hour, like the Streamlit UI
+# Each entry's TTL is cut by up to this fraction so entries cached together don't all expire together
+TTL_JITTER = 0.2
+# After expiry an entry is still served for this long while a background refresh runs.
+# Callers that must not see old fares (e.g. batch jobs) pass stale_ttl=0.
+DEFAULT_STALE_TTL = 10 * 60
+MAX_ENTRIES = 2048
+REFRESH_WORKERS = 4
+
+# Consecutive upstream failures that open the circuit
+FAILURE_THRESHOLD = 5
+# How long an open circuit fails fast before letting one trial call through
+RESET_TIMEOUT = 30
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream that has been failing."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream after repeated failures.
+
+    Closed: calls go through. After failure_threshold consecutive failures the
+    circuit opens and calls fail fast with CircuitOpenError. Once reset_timeout
+    has passed it is half-open: one trial call goes through, and its outcome
+    closes the circuit again or re-opens it.
+
+    is_failure decides which exceptions count as the upstream failing. Others
+    are re-raised without changing the state; by default every one counts.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT,
+        is_failure: Callable[[BaseException], bool] = lambda e: True,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+
+    def call(self, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            if self._opened_at is not None:
+                if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                    raise CircuitOpenError("Upstream is failing; not sending more requests for now")
+                self._trial_running = True
+
+        try:
+            value = func()
+        except Exception as e:
+            with self._lock:
+                self._trial_running = False
+                if self.is_failure(e):
+                    self._failures += 1
+                    if self._opened_at is not None or self._failures >= self.failure_threshold:
+                        self._opened_at = time.monotonic()
+            raise
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+        return value
+
+
+# Popularity of a search halves over this many seconds without new searches
+HISTORY_HALF_LIFE = 24 * 3600
+MAX_HISTORY_KEYS = 5000
+
+
+class CacheResult(NamedTuple):
+    value: Any
+    age: float  # Seconds since the value was fetched
+    stale: bool  # Past the fresh TTL; a refresh has been started
+    hit: bool  # Served from cache without waiting on the upstream
+
+
+class SearchHistory:
+    """
+    Decayed popularity of search arguments, plus how many searches were served warm.
+
+    Scores decay exponentially, so routes that were popular last week but not
+    today drop out of popular() on their own.
+    """
+
+    def __init__(self, half_life: float = HISTORY_HALF_LIFE, max_keys: int = MAX_HISTORY_KEYS):
+        self.half_life = half_life
+        self.max_keys = max_keys
+        self._scores: Dict[tuple, tuple] = {}  # key -> (score, updated_at)
+        self._searches = 0
+        self._warm = 0
+        self._lock = threading.Lock()
+
+    def _score(self, entry: tuple, now: float) -> float:
+        score, updated_at = entry
+        return score * 0.5 ** ((now - updated_at) / self.half_life)
+
+    def record(self, kwargs: Dict[str, Any], warm: bool) -> None:
+        key = tuple(sorted(kwargs.items()))
+        now = time.time()
+        with self._lock:
+            self._searches += 1
+            self._warm += warm
+            entry = self._scores.get(key)
+            self._scores[key] = ((self._score(entry, now) if entry else 0.0) + 1, now)
+            if len(self._scores) > self.max_keys:
+                # Drop the least popular tenth in one go rather than one key per search
+                ranked = sorted(self._scores, key=lambda k: self._score(self._scores[k], now))
+                for stale_key in ranked[:len(ranked) // 10]:
+                    del self._scores[stale_key]
+
+    def popular(self, limit: int) -> List[Dict[str, Any]]:
+        """Search arguments of the most popular searches, most popular first."""
+        now = time.time()
+        with self._lock:
+            ranked = sorted(self._scores.items(), key=lambda item: self._score(item[1], now), reverse=True)
+        return [dict(key) for key, _ in ranked[:limit]]
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "searches": self._searches,
+                "served_warm": self._warm,
+                "warm_share": self._warm / self._searches if self._searches else None,
+                "tracked_searches": len(self._scores),
+            }
+
+
+class TTLCache:
+    """
+    Thread-safe in-process cache with per-entry expiry and LRU eviction.
+
+    Concurrent misses for the same key share one upstream call instead of
+    each sending their own. Entries past their TTL but within stale_ttl are
+    served immediately, marked stale, while one background refresh replaces
+    them. Each entry's TTL is jittered below ttl to stagger expiry.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        stale_ttl: float = DEFAULT_STALE_TTL,
+        max_entries: int = MAX_ENTRIES,
+        breaker: Optional[CircuitBreaker] = None,
+        jitter: float = TTL_JITTER,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.jitter = jitter
+        self.max_entries = max_entries
+        self.breaker = breaker
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._refresh_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+
+    def lookup(self, key: Hashable, func: Callable[[], Any], stale_ttl: Optional[float] = None) -> CacheResult:
+        """
+        Cached value for key with its age, calling func on a miss.
+
+        stale_ttl overrides how long past expiry this caller accepts an entry;
+        0 waits for a fresh value instead.
+        """
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                fetched_at, value, ttl = entry
+                age = time.monotonic() - fetched_at
+                if age < ttl + stale_ttl:
+                    self._entries.move_to_end(key)
+                    stale = age >= ttl
+                    if stale and key not in self._in_flight:
+                        self._in_flight[key] = Future()
+                        self._refresh_executor.submit(self._background_refresh, key, func)
+                    return CacheResult(value, age, stale, True)
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+
+        if not owner:
+            return CacheResult(future.result(), 0.0, False, False)
+        return CacheResult(self._fill(key, func, future), 0.0, False, False)
+
+    def expires_in(self, key: Hashable) -> Optional[float]:
+        """Seconds until key goes stale (negative once it has), or None if it isn't cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        fetched_at, _, ttl = entry
+        return fetched_at + ttl - time.monotonic()
+
+    def in_flight(self) -> int:
+        """Upstream calls currently running for this cache."""
+        with self._lock:
+            return len(self._in_flight)
+
+    def refresh(self, key: Hashable, func: Callable[[], Any]) -> bool:
+        """
+        Replace key's entry with a new call to func, on the calling thread.
+
+        Returns False without calling func if a call for key is already running.
+        """
+        with self._lock:
+            if key in self._in_flight:
+                return False
+            future = self._in_flight[key] = Future()
+        self._fill(key, func, future)
+        return True
+
+    def _background_refresh(self, key: Hashable, func: Callable[[], Any]) -> None:
+        with self._lock:
+            future = self._in_flight[key]
+        try:
+            self._fill(key, func, future)
+        except Exception as e:
+            # Callers keep getting the stale entry until it ages out
+            print(f"Debug: Background refresh failed: {str(e)}")
+
+    def _fill(self, key: Hashable, func: Callable[[], Any], future: Future) -> Any:
+        """Call func for key and store the result. The caller must own the in-flight future."""
+        try:
+            value = self.breaker.call(func) if self.breaker else func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            with self._lock:
+                ttl = self.ttl * (1 - random.uniform(0, self.jitter))
+                self._entries[key] = (time.monotonic(), value, ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return value
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def cached(
+    func: Callable,
+    cache: TTLCache,
+    history: Optional[SearchHistory] = None,
+    stale_ttl: Optional[float] = None,
+) -> Callable:
+    """
+    Wrap func so calls with the same keyword arguments are served from cache.
+
+    wrapper.lookup(**kwargs) returns a CacheResult, for callers that show
+    whether the value is stale. wrapper.prefetch(**kwargs) is lookup for
+    speculative searches, and with wrapper.refresh(**kwargs) and
+    wrapper.expires_in(**kwargs) isn't recorded in history. stale_ttl is
+    passed to every lookup; wrappers of the same func share entries.
+    """
+
+    def make_key(kwargs: Dict[str, Any]) -> tuple:
+        return (func.__name__, tuple(sorted(kwargs.items())))
+
+    def lookup(**kwargs) -> CacheResult:
+        result = cache.lookup(make_key(kwargs), lambda: func(**kwargs), stale_ttl)
+        if history is not None:
+            history.record(kwargs, warm=result.hit)
+        return result
+
+    def prefetch(**kwargs) -> CacheResult:
+        return cache.lookup(make_key(kwargs), lambda: func(**kwargs), stale_ttl)
+
+    def refresh(**kwargs) -> bool:
+        return cache.refresh(make_key(kwargs), lambda: func(**kwargs))
+
+    def expires_in(**kwargs) -> Optional[float]:
+        return cache.expires_in(make_key(kwargs))
+
+    @wraps(func)
+    def wrapper(**kwargs):
+        return lookup(**kwargs).value
+
+    wrapper.cache = cache
+    wrapper.history = history
+    wrapper.lookup = lookup
+    wrapper.prefetch = prefetch
+    wrapper.refresh = refresh
+    wrapper.expires_in = expires_in
+    return wrapper
+
+
+# Process-wide search cache shared by every API session, batch worker and UI
+# session. Results are shared between callers and must be treated as read-only.
+# One breaker covers all three functions because they hit the same upstream,
+# and it only counts SerpAPI itself failing, not rejected requests.
+# Only outbound searches feed the history: return searches and booking URLs
+# depend on one-off tokens, so warming them would never pay off.
+# The *_fresh searches share the same entries but never serve stale fares.
+serpapi_breaker = CircuitBreaker(is_failure=booking_function.is_upstream_failure)
+search_cache = TTLCache(breaker=serpapi_breaker)
+search_history = SearchHistory()
+search_outbound_flights = cached(booking_function.search_outbound_flights, search_cache, search_history)
+search_return_flights = cached(booking_function.search_return_flights, search_cache)
+get_booking_url = cached(booking_function.get_booking_url, search_cache)
+search_outbound_flights_fresh = cached(booking_function.search_outbound_flights, search_cache, search_history, stale_ttl=0)
+search_return_flights_fresh = cached(booking_function.search_return_flights, search_cache, stale_ttl=0)
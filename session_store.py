@@ -0,0 +1,194 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Compressed size limit for one session's state
+MAX_SESSION_BYTES = 256 * 1024
+# Sessions untouched for this long are dropped
+IDLE_TIMEOUT = 2 * 60 * 60
+# How often a store sweeps out idle sessions while saving
+EVICT_INTERVAL = 60
+# Reads only refresh a SQLite session's last-used time once it is this old, so
+# most loads don't write to the database the replicas share
+TOUCH_INTERVAL = 60
+# Upper bound on sessions held by the in-memory store
+MAX_MEMORY_SESSIONS = 10_000
+
+
+class SessionTooLarge(ValueError):
+    pass
+
+
+def serialize(state: Dict[str, Any]) -> bytes:
+    """Compact JSON, zlib-compressed. Flight results compress roughly 10x."""
+    return zlib.compress(json.dumps(state, separators=(",", ":")).encode(), 6)
+
+
+def deserialize(blob: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(blob))
+
+
+def serialize_within_cap(state: Dict[str, Any], max_bytes: int = MAX_SESSION_BYTES) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Serialize state, dropping the oldest chat messages if it is over the size cap.
+
+    Returns:
+        The serialized state and the state it holds, which may have fewer messages
+
+    Raises:
+        SessionTooLarge: if the state is still too large with no history left.
+    """
+    blob = serialize(state)
+    messages = state.get("messages", [])
+    while len(blob) > max_bytes and messages:
+        messages = messages[2:]  # One user/assistant exchange at a time
+        state = {**state, "messages": messages}
+        blob = serialize(state)
+    if len(blob) > max_bytes:
+        raise SessionTooLarge(f"Session state is {len(blob)} bytes, over the {max_bytes} byte cap")
+    return blob, state
+
+
+class SessionStore(ABC):
+    """Where per-session state lives between requests. Subclasses provide the storage."""
+
+    def __init__(self, idle_timeout: float = IDLE_TIMEOUT, max_session_bytes: int = MAX_SESSION_BYTES):
+        self.idle_timeout = idle_timeout
+        self.max_session_bytes = max_session_bytes
+        self._last_eviction = time.monotonic()
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        blob = self._read(session_id)
+        return deserialize(blob) if blob is not None else None
+
+    def save(self, session_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Store state and return what was stored, which may have its oldest messages trimmed to fit the cap."""
+        blob, state = serialize_within_cap(state, self.max_session_bytes)
+        self._write(session_id, blob)
+        if time.monotonic() - self._last_eviction > EVICT_INTERVAL:
+            self._last_eviction = time.monotonic()
+            self.evict_idle()
+        return state
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        pass
+
+    @abstractmethod
+    def evict_idle(self) -> int:
+        """Drop sessions idle for longer than idle_timeout. Returns how many were dropped."""
+
+    @abstractmethod
+    def _read(self, session_id: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def _write(self, session_id: str, blob: bytes) -> None:
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store, bounded by session count and idle time."""
+
+    def __init__(self, max_sessions: int = MAX_MEMORY_SESSIONS, **kwargs):
+        super().__init__(**kwargs)
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _read(self, session_id: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or time.time() - entry[0] > self.idle_timeout:
+                return None
+            self._sessions[session_id] = (time.time(), entry[1])
+            self._sessions.move_to_end(session_id)
+            return entry[1]
+
+    def _write(self, session_id: str, blob: bytes) -> None:
+        with self._lock:
+            self._sessions[session_id] = (time.time(), blob)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_idle(self) -> int:
+        cutoff = time.time() - self.idle_timeout
+        evicted = 0
+        with self._lock:
+            # Least recently used first, so stop at the first live session
+            while self._sessions and next(iter(self._sessions.values()))[0] < cutoff:
+                self._sessions.popitem(last=False)
+                evicted += 1
+        return evicted
+
+
+class SQLiteSessionStore(SessionStore):
+    """File-backed store that several app replicas on one host or shared volume can use together."""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_by_age ON sessions (updated_at)")
+            self._conn.commit()
+
+    def _read(self, session_id: str) -> Optional[bytes]:
+        with self._lock:
+            now = time.time()
+            row = self._conn.execute(
+                "SELECT data, updated_at FROM sessions WHERE id = ? AND updated_at >= ?",
+                (session_id, now - self.idle_timeout),
+            ).fetchone()
+            if row is not None and now - row[1] > TOUCH_INTERVAL:
+                self._conn.execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (now, session_id))
+                self._conn.commit()
+        return row[0] if row else None
+
+    def _write(self, session_id: str, blob: bytes) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                (session_id, blob, time.time()),
+            )
+            self._conn.commit()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._conn.commit()
+
+    def evict_idle(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.idle_timeout,)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+
+def create_session_store() -> SessionStore:
+    """SQLite store at SESSION_STORE_PATH if set, otherwise an in-memory store."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    path = os.getenv("SESSION_STORE_PATH")
+    if path:
+        return SQLiteSessionStore(path)
+    return MemorySessionStore()
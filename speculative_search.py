@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from models import FlightParams
+
+SPECULATIVE_WORKERS = 8
+RESULT_TTL = 3600  # Keep results as long as the search cache would
+MAX_TRACKED_SEARCHES = 512
+
+
+def outbound_search_args(params: FlightParams) -> Optional[Dict[str, Any]]:
+    """
+    Outbound search arguments for the parameters collected so far.
+
+    Returns None until route and dates are known. For round trips the return
+    date is part of that minimal key because SerpAPI prices the pair.
+    """
+    if not params.is_searchable():
+        return None
+    return {
+        "departure_id": params.departure_id,
+        "arrival_id": params.arrival_id,
+        "outbound_date": params.outbound_date,
+        "return_date": params.return_date or params.outbound_date,  # Use outbound_date as return_date for one-way
+        "adults": params.adults,
+        "travel_class": params.travel_class,
+        "outbound_times": params.outbound_times,
+    }
+
+
+class SpeculativeSearch:
+    """
+    Runs outbound searches in the background while the conversation continues.
+
+    Each distinct set of search arguments is prefetched at most once per TTL
+    and shared by every session in the process. If passengers or cabin change
+    later, the next prefetch simply starts a search for the new arguments.
+
+    search should be cached with single-flight (see search_cache): take()
+    calls it again, which joins a running prefetch or hits its cached result.
+    prefetch_search, if given, is used for the background searches instead,
+    e.g. a variant that doesn't count them as user searches.
+    """
+
+    def __init__(
+        self,
+        search: Callable[..., Any],
+        workers: int = SPECULATIVE_WORKERS,
+        ttl: float = RESULT_TTL,
+        prefetch_search: Optional[Callable[..., Any]] = None,
+    ):
+        self.search = search
+        self.prefetch_search = prefetch_search or search
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculative-search")
+        self._searches: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: tuple) -> Optional[Future]:
+        """Return a live search for key, dropping it if expired or failed. Call with the lock held."""
+        entry = self._searches.get(key)
+        if entry is None:
+            return None
+        started_at, future = entry
+        failed = future.done() and future.exception() is not None
+        if failed or time.monotonic() - started_at > self.ttl:
+            del self._searches[key]
+            return None
+        return future
+
+    def _start(self, key: tuple, kwargs: Dict[str, Any]) -> Future:
+        """Submit a search for key. Call with the lock held."""
+        future = self._executor.submit(self.prefetch_search, **kwargs)
+        self._searches[key] = (time.monotonic(), future)
+        while len(self._searches) > MAX_TRACKED_SEARCHES:
+            self._searches.popitem(last=False)
+        return future
+
+    def prefetch(self, params: FlightParams) -> bool:
+        """Start a background search if enough is known and none is running. Returns whether one started."""
+        kwargs = outbound_search_args(params)
+        if kwargs is None:
+            return False
+        key = tuple(sorted(kwargs.items()))
+        with self._lock:
+            if self._lookup(key) is not None:
+                return False
+            self._start(key, kwargs)
+            return True
+
+    def is_ready(self, params: FlightParams) -> bool:
+        """Whether take() would return without waiting on SerpAPI."""
+        kwargs = outbound_search_args(params)
+        if kwargs is None:
+            return False
+        with self._lock:
+            future = self._lookup(tuple(sorted(kwargs.items())))
+        return future is not None and future.done()
+
+    def take(self, params: FlightParams) -> Any:
+        """Outbound flights for params, from the prefetched search when one matches."""
+        kwargs = outbound_search_args(params)
+        if kwargs is None:
+            raise ValueError("Route and dates are required to search for flights")
+        # Going through the cache rather than the prefetch future means a result
+        # that has since gone stale is refreshed rather than served as fresh
+        return self.search(**kwargs)
@@ -1,226 +1,474 @@
+import contextlib
+import copy
+import hashlib
+import json
+import time
+import uuid
 import streamlit as st
-from ai_utils import get_model_response, update_parameters
+from pydantic import ValidationError
+from ai_utils import INVALID_UPDATE_MESSAGE, create_client, get_model_response, load_parameters, update_parameters
+from cache_warmer import create_cache_warmer
 from models import FlightParams, AIResponse
-from booking_function import search_outbound_flights, search_return_flights, get_booking_url
+from search_cache import CircuitOpenError, get_booking_url, search_outbound_flights, search_return_flights
+from session_store import SessionTooLarge, create_session_store
+from speculative_search import SpeculativeSearch
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple, Union
+from typing import List, Dict, Any, Optional
 
-def display_flight_cards(flights: Union[List[Dict[str, Any]], List[Tuple[Dict[str, Any], Dict[str, Any]]]], trip_type: int):
+# Searches go through the process-wide search cache shared with the API and
+# batch jobs. It serves slightly stale results while refreshing them and
+# stops calling SerpAPI while it is failing.
+SEARCH_UNAVAILABLE_MESSAGE = "Flight search is temporarily unavailable. Please try again in a minute."
+
+# The page is split into fragments that rerun independently: the newest block
+# of chat history, the live chat turn, the parameter panel, the results list and
+# each flight card. Only a change of mode (chat -> results, outbound -> return
+# flights) or a full history block reruns the whole app.
+
+# Background outbound searches a session may start before pressing "Search Flights"
+MAX_SPECULATIVE_SEARCHES = 3
+
+# Chat history is drawn in blocks of this many messages. Only the newest block is
+# redrawn on each turn; older blocks are drawn once per full run. The app reruns
+# in full when a block fills up, so each turn redraws at most one block, plus the
+# whole conversation once every HISTORY_BLOCK_MESSAGES / 2 turns.
+HISTORY_BLOCK_MESSAGES = 20
+
+# Per-session state lives in the session store, which caps its size; st.session_state
+# only holds the session id. Every run, including fragment reruns, loads the state
+# from the store and saves it back after changing it.
+DEFAULT_STATE = {
+    "messages": [],
+    "flight_params": {},
+    "live_message_count": 0,  # Newest messages drawn by chat_turn rather than chat_history
+    "search_mode": False,
+    "flights": [],
+    "selected_flight": None,
+    "booking_urls": {},
+    "speculative_searches": 0,
+    "results_checked_at": None,
+}
+
+
+@st.cache_resource
+def get_openai_client():
+    """One OpenAI client for every session served by this process."""
+    return create_client()
+
+
+@st.cache_resource
+def get_speculative_search():
+    """Outbound searches started while the user is still chatting, shared by all sessions."""
+    return SpeculativeSearch(search_outbound_flights.lookup, prefetch_search=search_outbound_flights.prefetch)
+
+
+@st.cache_resource
+def start_cache_warmer():
+    """Keep popular searches warm in this process's search cache (disabled with CACHE_WARM_BUDGET=0)."""
+    warmer = create_cache_warmer()
+    if warmer:
+        warmer.start()
+    return warmer
+
+
+@st.cache_resource
+def get_session_store():
+    """Session store shared by every session in this process (SQLite when SESSION_STORE_PATH is set)."""
+    return create_session_store()
+
+
+def get_session_id() -> str:
+    """Session id kept in the URL, so a reconnect to another replica finds the same state."""
+    if "session_id" not in st.session_state:
+        session_id = st.query_params.get("sid") or uuid.uuid4().hex
+        st.query_params["sid"] = session_id
+        st.session_state.session_id = session_id
+    return st.session_state.session_id
+
+
+def load_state() -> Dict[str, Any]:
+    """This session's state from the store, with defaults for anything not saved yet."""
+    return {**copy.deepcopy(DEFAULT_STATE), **(get_session_store().load(get_session_id()) or {})}
+
+
+def save_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Save state to the store. Call after changing it and before st.rerun().
+
+    Returns the state as stored, which may have dropped the oldest messages
+    to fit the size cap.
+    """
+    try:
+        return get_session_store().save(get_session_id(), state)
+    except SessionTooLarge as e:
+        # Even without chat history the results don't fit, so drop them rather than the session
+        print(f"Debug: Dropping search results to fit the session cap: {str(e)}")
+        return get_session_store().save(get_session_id(), {
+            **state, "search_mode": False, "flights": [], "selected_flight": None, "booking_urls": {},
+        })
+
+
+def get_flight_params(state: Dict[str, Any]) -> FlightParams:
+    return load_parameters(state["flight_params"])
+
+
+def history_cursor(state: Dict[str, Any]) -> int:
+    """Number of messages drawn before chat_turn; the rest belong to chat_turn."""
+    return max(0, len(state["messages"]) - state["live_message_count"])
+
+
+def history_block_start(state: Dict[str, Any]) -> int:
+    """First message drawn by chat_history; earlier ones are only drawn by full runs."""
+    cursor = history_cursor(state)
+    return cursor - cursor % HISTORY_BLOCK_MESSAGES
+
+
+def display_messages(messages: List[Dict[str, str]]):
+    for message in messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+
+def record_staleness(state: Dict[str, Any], result):
+    """Remember when a stale search result was fetched, or clear the marker for a fresh one."""
+    state["results_checked_at"] = time.time() - result.age if result.stale else None
+
+
+def display_staleness(state: Dict[str, Any]):
+    checked_at = state["results_checked_at"]
+    if checked_at:
+        minutes = int((time.time() - checked_at) // 60)
+        st.caption(f"Prices were last checked {minutes} minutes ago and are being refreshed.")
+
+
+def display_segments(segments: List[Dict[str, Any]]):
+    for segment in segments:
+        st.markdown(f"""
+        **Departure:** {segment["departure_airport"]["time"]} from {segment["departure_airport"]["name"]} ({segment["departure_airport"]["id"]})  
+        **Arrival:** {segment["arrival_airport"]["time"]} at {segment["arrival_airport"]["name"]} ({segment["arrival_airport"]["id"]})  
+        **Airline:** {segment["airline"]} {segment["flight_number"]}  
+        **Duration:** {segment["duration"]} mins
+        """)
+
+
+def flight_key(*flights: Dict[str, Any]) -> str:
+    """
+    Stable id for a card's flights, used for widget keys and saved booking links.
+
+    Unlike hash(), it is the same in every process, so links saved by one
+    replica still match their card after a reconnect to another.
+    """
+    return hashlib.sha1(json.dumps(flights, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def display_booking_link(booking_urls: Dict[str, str], flight_id: str):
+    """Show the booking link fetched for this card on an earlier click, if any."""
+    booking_url = booking_urls.get(flight_id)
+    if booking_url:
+        st.markdown(f"[Book this flight]({booking_url})")
+
+
+# The cards get the parameters and saved booking links from display_flight_cards
+# rather than each loading the session, and only load it to save a selection.
+
+@st.fragment
+def round_trip_card(
+    params: FlightParams,
+    booking_urls: Dict[str, str],
+    outbound: Dict[str, Any],
+    return_flight: Optional[Dict[str, Any]],
+):
+    """One round-trip result. Selecting it only reruns this card."""
+    with st.expander(
+        f"${outbound.get('price', 0) / 2:.2f} - {outbound['flights'][0]['departure_airport']['time']} to {outbound['flights'][-1]['arrival_airport']['time']}",
+        expanded=True
+    ):
+        cols = st.columns([3, 2])
+
+        with cols[0]:
+            # Outbound flight details
+            st.markdown("### Outbound Flight")
+            display_segments(outbound["flights"])
+
+            # Return flight details if available
+            if return_flight:
+                st.markdown("### Return Flight")
+                display_segments(return_flight["flights"])
+
+        with cols[1]:
+            if return_flight:
+                outbound_price = outbound.get("price", 0) / 2
+                return_price = return_flight.get("price", 0) / 2
+                total_price = outbound_price + return_price
+                flight_id = flight_key(outbound, return_flight)
+                button_text = "Select Round Trip"
+            else:
+                total_price = outbound.get("price", 0) / 2
+                flight_id = flight_key(outbound)
+                button_text = "Select Outbound Flight"
+
+            st.markdown(f"### ${total_price:.2f}")
+            st.markdown(f"*{outbound['flights'][0].get('travel_class', 'Economy')}*")
+
+            if st.button(button_text, key=f"select_{flight_id}", type="primary"):
+                state = load_state()
+                if return_flight:
+                    state["selected_flight"] = [outbound, return_flight]
+                    try:
+                        booking_urls[flight_id] = state["booking_urls"][flight_id] = get_booking_url(
+                            departure_id=params.departure_id,
+                            arrival_id=params.arrival_id,
+                            outbound_date=params.outbound_date,
+                            trip_type=params.trip_type,
+                            return_date=params.return_date,
+                            booking_token=return_flight.get("booking_token", "")
+                        )
+                    except Exception:
+                        st.markdown("Unable to process booking at this time.")
+                    save_state(state)
+                else:
+                    with st.spinner(""):
+                        try:
+                            result = search_return_flights.lookup(
+                                departure_id=params.departure_id,
+                                arrival_id=params.arrival_id,
+                                outbound_date=params.outbound_date,
+                                return_date=params.return_date,
+                                departure_token=outbound["departure_token"],
+                                adults=params.adults,
+                                travel_class=params.travel_class,
+                                return_times=params.return_times
+                            )
+                            if result.value:
+                                state["flights"] = [
+                                    [outbound, return_flight]
+                                    for return_flight in result.value
+                                ]
+                                record_staleness(state, result)
+                                save_state(state)
+                                # The whole results list changes, not just this card
+                                st.rerun()
+                        except CircuitOpenError:
+                            st.markdown(SEARCH_UNAVAILABLE_MESSAGE)
+                        except Exception:
+                            st.markdown("Unable to find return flights at this time.")
+
+            display_booking_link(booking_urls, flight_id)
+
+
+@st.fragment
+def one_way_card(params: FlightParams, booking_urls: Dict[str, str], flight: Dict[str, Any]):
+    """One one-way result. Selecting it only reruns this card."""
+    with st.expander(
+        f"${flight.get('price', 0) / 2:.2f} - {flight['flights'][0]['departure_airport']['time']} to {flight['flights'][-1]['arrival_airport']['time']}",
+        expanded=True
+    ):
+        cols = st.columns([3, 2])
+
+        with cols[0]:
+            display_segments(flight["flights"])
+
+        with cols[1]:
+            price = flight.get("price", 0) / 2
+            st.markdown(f"### ${price:.2f}")
+            st.markdown(f"*{flight['flights'][0].get('travel_class', 'Economy')}*")
+
+            flight_id = flight_key(flight)
+            if st.button("Select Flight", key=f"select_{flight_id}", type="primary"):
+                state = load_state()
+                state["selected_flight"] = flight
+                try:
+                    booking_urls[flight_id] = state["booking_urls"][flight_id] = get_booking_url(
+                        departure_id=params.departure_id,
+                        arrival_id=params.arrival_id,
+                        outbound_date=params.outbound_date,
+                        return_date=None,
+                        trip_type=2,
+                        booking_token=flight.get("booking_token", "")
+                    )
+                except Exception:
+                    st.markdown("Unable to process booking at this time.")
+                save_state(state)
+
+            display_booking_link(booking_urls, flight_id)
+
+
+@st.fragment
+def display_flight_cards():
     """Display flight results in a card format."""
-    
-    if trip_type == 1:  # Round trip
+    state = load_state()
+    flights = state["flights"]
+    params = get_flight_params(state)
+
+    if params.trip_type == 1:  # Round trip
         # Add a back button if viewing return flights
         if any(return_flight is not None for _, return_flight in flights):
             if st.button("← Back to Outbound Flights"):
-                st.session_state.flights = [(flight, None) for flight, _ in flights]
-                st.rerun()
-        
+                state["flights"] = [[flight, None] for flight, _ in flights]
+                save_state(state)
+                st.rerun(scope="fragment")
+
         for outbound, return_flight in flights:
-            with st.expander(
-                f"${outbound.get('price', 0) / 2:.2f} - {outbound['flights'][0]['departure_airport']['time']} to {outbound['flights'][-1]['arrival_airport']['time']}", 
-                expanded=True
-            ):
-                cols = st.columns([3, 2])
-                
-                with cols[0]:
-                    # Outbound flight details
-                    st.markdown("### Outbound Flight")
-                    for segment in outbound["flights"]:
-                        st.markdown(f"""
-                        **Departure:** {segment["departure_airport"]["time"]} from {segment["departure_airport"]["name"]} ({segment["departure_airport"]["id"]})  
-                        **Arrival:** {segment["arrival_airport"]["time"]} at {segment["arrival_airport"]["name"]} ({segment["arrival_airport"]["id"]})  
-                        **Airline:** {segment["airline"]} {segment["flight_number"]}  
-                        **Duration:** {segment["duration"]} mins
-                        """)
-                    
-                    # Return flight details if available
-                    if return_flight:
-                        st.markdown("### Return Flight")
-                        for segment in return_flight["flights"]:
-                            st.markdown(f"""
-                            **Departure:** {segment["departure_airport"]["time"]} from {segment["departure_airport"]["name"]} ({segment["departure_airport"]["id"]})  
-                            **Arrival:** {segment["arrival_airport"]["time"]} at {segment["arrival_airport"]["name"]} ({segment["arrival_airport"]["id"]})  
-                            **Airline:** {segment["airline"]} {segment["flight_number"]}  
-                            **Duration:** {segment["duration"]} mins
-                            """)
-                
-                with cols[1]:
-                    if return_flight:
-                        outbound_price = outbound.get("price", 0) / 2
-                        return_price = return_flight.get("price", 0) / 2
-                        total_price = outbound_price + return_price
-                        flight_id = f"{hash(str(outbound))}{hash(str(return_flight))}"
-                        button_text = "Select Round Trip"
-                    else:
-                        total_price = outbound.get("price", 0) / 2
-                        flight_id = str(hash(str(outbound)))
-                        button_text = "Select Outbound Flight"
-                    
-                    st.markdown(f"### ${total_price:.2f}")
-                    st.markdown(f"*{outbound['flights'][0].get('travel_class', 'Economy')}*")
-                    
-                    if st.button(button_text, key=f"select_{flight_id}", type="primary"):
-                        if return_flight:
-                            st.session_state.selected_flight = (outbound, return_flight)
-                            params = st.session_state.flight_params
-                            try:
-                                booking_url = get_booking_url(
-                                    departure_id=params.departure_id,
-                                    arrival_id=params.arrival_id,
-                                    outbound_date=params.outbound_date,
-                                    trip_type=params.trip_type,
-                                    return_date=params.return_date,
-                                    booking_token=return_flight.get("booking_token", "")
-                                )
-                                st.markdown(f"[Book this flight]({booking_url})")
-                            except Exception:
-                                st.markdown("Unable to process booking at this time.")
-                        else:
-                            params = st.session_state.flight_params
-                            with st.spinner(""):
-                                try:
-                                    return_flights = search_return_flights(
-                                        departure_id=params.departure_id,
-                                        arrival_id=params.arrival_id,
-                                        outbound_date=params.outbound_date,
-                                        return_date=params.return_date,
-                                        departure_token=outbound["departure_token"],
-                                        adults=params.adults,
-                                        travel_class=params.travel_class,
-                                        return_times=params.return_times
-                                    )
-                                    if return_flights:
-                                        st.session_state.flights = [
-                                            (outbound, return_flight) 
-                                            for return_flight in return_flights
-                                        ]
-                                        st.rerun()
-                                except Exception:
-                                    st.markdown("Unable to find return flights at this time.")
-    
+            round_trip_card(params, state["booking_urls"], outbound, return_flight)
+
     else:  # One way
         for flight in flights:
-            with st.expander(
-                f"${flight.get('price', 0) / 2:.2f} - {flight['flights'][0]['departure_airport']['time']} to {flight['flights'][-1]['arrival_airport']['time']}", 
-                expanded=True
-            ):
-                cols = st.columns([3, 2])
-                
-                with cols[0]:
-                    for segment in flight["flights"]:
-                        st.markdown(f"""
-                        **Departure:** {segment["departure_airport"]["time"]} from {segment["departure_airport"]["name"]} ({segment["departure_airport"]["id"]})  
-                        **Arrival:** {segment["arrival_airport"]["time"]} at {segment["arrival_airport"]["name"]} ({segment["arrival_airport"]["id"]})  
-                        **Airline:** {segment["airline"]} {segment["flight_number"]}  
-                        **Duration:** {segment["duration"]} mins
-                        """)
-                
-                with cols[1]:
-                    price = flight.get("price", 0) / 2
-                    st.markdown(f"### ${price:.2f}")
-                    st.markdown(f"*{flight['flights'][0].get('travel_class', 'Economy')}*")
-                    
-                    flight_id = str(hash(str(flight)))
-                    if st.button("Select Flight", key=f"select_{flight_id}", type="primary"):
-                        st.session_state.selected_flight = flight
-                        params = st.session_state.flight_params
-                        try:
-                            booking_url = get_booking_url(
-                                departure_id=params.departure_id,
-                                arrival_id=params.arrival_id,
-                                outbound_date=params.outbound_date,
-                                return_date=None,
-                                trip_type=2,
-                                booking_token=flight.get("booking_token", "")
-                            )
-                            st.markdown(f"[Book this flight]({booking_url})")
-                        except Exception:
-                            st.markdown("Unable to process booking at this time.")
+            one_way_card(params, state["booking_urls"], flight)
 
-def main():
-    st.title("Tailwind")
 
-    # Initialize states
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-    if "flight_params" not in st.session_state:
-        st.session_state.flight_params = FlightParams()
-    if "search_mode" not in st.session_state:
-        st.session_state.search_mode = False
+def archive_live_exchange():
+    """
+    On a new prompt, move the exchange shown by chat_turn into chat_history.
 
-    # Chat interface (only show if not in search mode)
-    if not st.session_state.search_mode:
-        # Display chat messages from history
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
-
-        # Accept user input
-        if prompt := st.chat_input("How can I help you book a flight today?"):
+    Runs as the chat input's callback, before either fragment reruns, so the
+    turn fragment only ever draws the newest exchange.
+    """
+    state = load_state()
+    if state["live_message_count"]:
+        state["live_message_count"] = 0
+        save_state(state)
+        st.rerun(["chat_history", "chat_turn"])
+
+
+@st.fragment(key="chat_history")
+def chat_history():
+    """The newest history block: exchanges since the last full block, before the newest one."""
+    state = load_state()
+    display_messages(state["messages"][history_block_start(state):history_cursor(state)])
+
+
+@st.fragment(key="chat_turn")
+def chat_turn():
+    """The newest exchange plus the chat input. Each new turn only reruns this and chat_history."""
+    state = load_state()
+
+    # Fragments can still write to st.bottom, which keeps the input pinned to the bottom of the page
+    with st.bottom:
+        prompt = st.chat_input("How can I help you book a flight today?", on_submit=archive_live_exchange)
+
+    live_messages = st.container()
+    with live_messages:
+        display_messages(state["messages"][history_cursor(state):])
+
+    # Accept user input
+    if prompt:
+        with live_messages:
             with st.chat_message("user"):
                 st.markdown(prompt)
-            st.session_state.messages.append({"role": "user", "content": prompt})
-
-            ai_response = get_model_response(prompt, st.session_state.flight_params)
-            
-            # Only update parameters if we got a valid response
-            if ai_response:
-                updated_params = update_parameters(st.session_state.flight_params, ai_response)
-                st.session_state.flight_params = updated_params
-                
+        state["messages"].append({"role": "user", "content": prompt})
+        state["live_message_count"] += 1
+
+        params = get_flight_params(state)
+        was_complete = params.completion
+        ai_response = get_model_response(prompt, params, get_openai_client())
+
+        # Only update parameters if we got a valid response
+        if ai_response:
+            try:
+                params = update_parameters(params, ai_response)
+            except ValidationError as e:
+                # Keep the last valid parameters and ask again
+                print(f"Debug: Rejected invalid parameter update: {str(e)}")
+                ai_response = AIResponse(message=INVALID_UPDATE_MESSAGE)
+            state["flight_params"] = params.dict(exclude_none=True)
+
+            with live_messages:
                 with st.chat_message("assistant"):
                     if ai_response.message:
                         st.markdown(ai_response.message)
-                    params_display = st.session_state.flight_params.dict(exclude_none=True)
-                    if params_display:
-                        st.json(params_display)
-
-                if ai_response.message:
-                    st.session_state.messages.append({"role": "assistant", "content": ai_response.message})
-
-        # Show search button when parameters are complete
-        if st.session_state.flight_params.completion:
-            if st.button("Search Flights"):
-                st.session_state.search_mode = True
-                with st.spinner("Searching for available flights..."):
-                    try:
-                        params = st.session_state.flight_params
-                        
-                        # For both one-way and round-trip, we need to search outbound
-                        outbound_flights = search_outbound_flights(
-                            departure_id=params.departure_id,
-                            arrival_id=params.arrival_id,
-                            outbound_date=params.outbound_date,
-                            return_date=params.return_date or params.outbound_date,  # Use outbound_date as return_date for one-way
-                            adults=params.adults,
-                            travel_class=params.travel_class,
-                            outbound_times=params.outbound_times
-                        )
-                        
-                        if outbound_flights:
-                            if params.trip_type == 1:  # Round trip
-                                # Store outbound flights without return flights
-                                st.session_state.flights = [(flight, None) for flight in outbound_flights if "departure_token" in flight]
-                            else:  # One way
-                                st.session_state.flights = outbound_flights
-                            st.rerun()
-                        else:
-                            st.error("No flights found matching your criteria.")
-                            st.session_state.search_mode = False
-                            
-                    except Exception as e:
-                        st.error(f"Error searching for flights: {str(e)}")
-                        st.session_state.search_mode = False
+                    if state["flight_params"]:
+                        st.json(state["flight_params"])
+
+            if ai_response.message:
+                state["messages"].append({"role": "assistant", "content": ai_response.message})
+                state["live_message_count"] += 1
+
+            # Start searching as soon as route and dates are known so results are ready on "Search Flights"
+            if state["speculative_searches"] < MAX_SPECULATIVE_SEARCHES:
+                if get_speculative_search().prefetch(params):
+                    state["speculative_searches"] += 1
+
+        # An exchange that fills the newest history block is archived straight away,
+        # and the whole app reruns to draw that block with the older ones
+        message_count = len(state["messages"])
+        block_filled = message_count // HISTORY_BLOCK_MESSAGES > history_cursor(state) // HISTORY_BLOCK_MESSAGES
+        if block_filled:
+            state["live_message_count"] = 0
+        state = save_state(state)
+
+        # The parameter panel only needs redrawing when completion changes, and the
+        # history blocks when the oldest messages were trimmed to fit the session cap
+        if block_filled or params.completion != was_complete or len(state["messages"]) < message_count:
+            st.rerun()
+
+
+@st.fragment
+def parameter_panel():
+    """Search button once all parameters are collected."""
+    state = load_state()
+    params = get_flight_params(state)
+    if not params.completion:
+        return
+
+    if st.button("Search Flights"):
+        state["search_mode"] = True
+        speculative_search = get_speculative_search()
+        # Usually the speculative search has already finished and no spinner is needed
+        spinner = (
+            contextlib.nullcontext() if speculative_search.is_ready(params)
+            else st.spinner("Searching for available flights...")
+        )
+        with spinner:
+            try:
+                # For both one-way and round-trip, we need to search outbound
+                result = speculative_search.take(params)
+                outbound_flights = result.value
+
+                if outbound_flights:
+                    if params.trip_type == 1:  # Round trip
+                        # Store outbound flights without return flights
+                        state["flights"] = [[flight, None] for flight in outbound_flights if "departure_token" in flight]
+                    else:  # One way
+                        state["flights"] = outbound_flights
+                    record_staleness(state, result)
+                    save_state(state)
+                    st.rerun()
+                else:
+                    st.error("No flights found matching your criteria.")
+                    state["search_mode"] = False
+
+            except CircuitOpenError:
+                st.error(SEARCH_UNAVAILABLE_MESSAGE)
+                state["search_mode"] = False
+            except Exception as e:
+                st.error(f"Error searching for flights: {str(e)}")
+                state["search_mode"] = False
+        save_state(state)
+
+
+def main():
+    st.title("Tailwind")
+    start_cache_warmer()
+
+    # State saved by this or another replica, or defaults for a new session
+    state = load_state()
+
+    # Chat interface (only show if not in search mode)
+    if not state["search_mode"]:
+        # Full history blocks are drawn here, the newest block by the history fragment
+        # and the newest exchange by the turn fragment
+        display_messages(state["messages"][:history_block_start(state)])
+        chat_history()
+        chat_turn()
+        parameter_panel()
 
     # Search results mode
     else:
-        if "flights" in st.session_state and st.session_state.flights:
+        if state["flights"]:
             st.subheader("Available Flights")
-            display_flight_cards(
-                st.session_state.flights, 
-                st.session_state.flight_params.trip_type
-            )
-            
+            display_staleness(state)
+            display_flight_cards()
+
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
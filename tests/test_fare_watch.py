@@ -0,0 +1,108 @@
+import json
+from datetime import datetime
+
+import pytest
+
+import fare_watch
+from fare_watch import (
+    FAR_OUT_DAYS, MAX_POLL_INTERVAL, MIN_POLL_INTERVAL, VOLATILITY_WINDOW,
+    add_watch, check_watch, connect, diff_snapshots, has_moved, list_watches, next_poll_interval, route_volatility,
+)
+from models import FlightParams
+
+NOW = datetime(2030, 1, 1).timestamp()
+
+
+def add_snapshots(conn, watch_id, changed):
+    """Store one snapshot per entry of changed, oldest first."""
+    for i, moved in enumerate(changed):
+        conn.execute(
+            "INSERT INTO snapshots (watch_id, taken_at, itineraries, changed) VALUES (?, ?, ?, ?)",
+            (watch_id, NOW + i, "{}", int(moved)),
+        )
+    conn.commit()
+
+
+@pytest.fixture
+def conn():
+    conn = connect(":memory:")
+    yield conn
+    conn.close()
+
+
+def test_diff_reports_new_removed_and_price_drops():
+    old = {"a": 300.0, "b": 200.0, "c": 150.0, "gone": 100.0}
+    new = {"a": 250.0, "b": 199.5, "c": 180.0, "added": 90.0}
+
+    changes = diff_snapshots(old, new)
+
+    assert {(c["type"], c["itinerary"]) for c in changes} == {
+        ("price_drop", "a"), ("new", "added"), ("removed", "gone"),
+    }
+    drop = next(c for c in changes if c["type"] == "price_drop")
+    assert (drop["old_price"], drop["price"]) == (300.0, 250.0)
+
+
+def test_diff_ignores_missing_prices():
+    assert diff_snapshots({"a": None}, {"a": 100.0}) == []
+    assert diff_snapshots({"a": 100.0}, {"a": None}) == []
+
+
+def test_has_moved_counts_rises_but_not_noise():
+    assert not has_moved({"a": 100.0}, {"a": 100.5})
+    assert has_moved({"a": 100.0}, {"a": 120.0})
+    assert has_moved({"a": 100.0}, {"b": 100.0})
+    assert not has_moved({}, {})
+
+
+def test_poll_interval_follows_volatility_and_departure():
+    far = datetime.fromtimestamp(NOW + 2 * FAR_OUT_DAYS * 86400).strftime("%Y-%m-%d")
+    near = datetime.fromtimestamp(NOW + FAR_OUT_DAYS / 4 * 86400).strftime("%Y-%m-%d")
+
+    assert next_poll_interval(0.0, far, NOW) == MAX_POLL_INTERVAL
+    assert next_poll_interval(1.0, far, NOW) == MIN_POLL_INTERVAL
+    assert next_poll_interval(0.0, near, NOW) == pytest.approx(MAX_POLL_INTERVAL / 4, rel=0.01)
+    assert next_poll_interval(0.5, near, NOW) < next_poll_interval(0.0, near, NOW)
+    assert next_poll_interval(0.0, "2029-12-01", NOW) == MIN_POLL_INTERVAL
+
+
+def test_volatility_of_unchecked_watch_is_half(conn):
+    assert route_volatility(conn, 1) == 0.5
+    add_snapshots(conn, 1, [False])
+    assert route_volatility(conn, 1) == 0.5
+
+
+def test_volatility_skips_first_snapshot(conn):
+    add_snapshots(conn, 1, [True, True, False])
+    assert route_volatility(conn, 1) == 0.5
+
+
+def test_volatility_uses_recent_window_once_history_is_long(conn):
+    # Four old checks that changed, then a full window of which a quarter changed
+    recent = [True, False, False, False] * (VOLATILITY_WINDOW // 4)
+    add_snapshots(conn, 1, [False] + [True] * 4 + recent)
+    add_snapshots(conn, 2, [True] * 20)
+
+    assert route_volatility(conn, 1) == 0.25
+
+
+def test_check_watch_reports_changes_and_schedules_next_check(conn, monkeypatch):
+    def results(*prices):
+        return [
+            {"price": price, "flights": [{"flight_number": f"DL {i}", "departure_airport": {"time": "2030-03-01 08:00"}}]}
+            for i, price in enumerate(prices)
+        ]
+
+    replies = iter([results(300, 200), results(250, 200)])
+    monkeypatch.setattr(fare_watch, "search_outbound_flights", lambda **kwargs: next(replies))
+    params = FlightParams(departure_id="ATL", arrival_id="CDG", trip_type=2, outbound_date="2030-03-01")
+    watch_id = add_watch(conn, params, now=NOW)
+
+    assert check_watch(conn, list_watches(conn)[0], now=NOW) == []
+    changes = check_watch(conn, list_watches(conn)[0], now=NOW + 3600)
+
+    assert changes == [{"type": "price_drop", "itinerary": "DL 0@2030-03-01 08:00", "old_price": 300, "price": 250}]
+    snapshots = conn.execute("SELECT changed, itineraries FROM snapshots WHERE watch_id = ?", (watch_id,)).fetchall()
+    assert [row["changed"] for row in snapshots] == [0, 1]
+    assert json.loads(snapshots[-1]["itineraries"])["DL 0@2030-03-01 08:00"] == 250
+    assert list_watches(conn)[0]["next_check_at"] >= NOW + 3600 + MIN_POLL_INTERVAL
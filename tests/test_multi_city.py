@@ -0,0 +1,77 @@
+import itertools
+import random
+
+from multi_city import compatible_pairs, k_best_itineraries, leg_price
+
+
+def flight(price, departs, arrives):
+    """Minimal SerpAPI-shaped option; times are "YYYY-MM-DD HH:MM"."""
+    return {
+        "price": price,
+        "flights": [{"departure_airport": {"time": departs}, "arrival_airport": {"time": arrives}}],
+    }
+
+
+def brute_force(options, gaps_minutes, k):
+    """Every feasible combination, cheapest first."""
+    totals = []
+    for combination in itertools.product(*options):
+        feasible = all(
+            compatible_pairs([combination[i]], [combination[i + 1]], gaps_minutes[i])[0][0]
+            for i in range(len(combination) - 1)
+        )
+        if feasible:
+            totals.append(sum(leg_price(f) for f in combination))
+    return sorted(totals)[:k]
+
+
+def test_returns_cheapest_itineraries_in_price_order():
+    rng = random.Random(7)
+    options = []
+    for day in range(1, 4):
+        leg = []
+        for _ in range(8):
+            hour = rng.randint(6, 20)
+            leg.append(flight(
+                rng.randint(50, 400),
+                f"2030-05-0{day} {hour:02d}:00",
+                f"2030-05-0{day} {hour + 3:02d}:00",
+            ))
+        options.append(sorted(leg, key=leg_price))
+
+    itineraries = k_best_itineraries(options, [90, 90], k=15)
+
+    assert [i["total_price"] for i in itineraries] == brute_force(options, [90, 90], 15)
+    for itinerary in itineraries:
+        assert itinerary["total_price"] == sum(leg_price(f) for f in itinerary["legs"])
+
+
+def test_skips_infeasible_cheap_combinations():
+    # Cheap first legs land at 20:00; cheap second legs leave at 08:00 the same day
+    first = [flight(100 + i, "2030-05-01 17:00", "2030-05-01 20:00") for i in range(40)]
+    first += [flight(500 + i, "2030-05-01 05:00", "2030-05-01 06:00") for i in range(10)]
+    second = [flight(100 + i, "2030-05-01 08:00", "2030-05-01 10:00") for i in range(40)]
+    second += [flight(600 + i, "2030-05-01 22:00", "2030-05-01 23:00") for i in range(10)]
+    later = [[flight(100 + i, f"2030-05-0{day} 12:00", f"2030-05-0{day} 14:00") for i in range(50)]
+             for day in (3, 5)]
+    options = [first, second] + later
+
+    itineraries = k_best_itineraries(options, [90, 90, 90], k=5)
+
+    assert len(itineraries) == 5
+    # Cheapest feasible: a 20:00 arrival into a 22:00 departure, or a 06:00 arrival into an 08:00 one
+    cheapest_pair = min(leg_price(first[0]) + leg_price(second[40]), leg_price(first[40]) + leg_price(second[0]))
+    assert itineraries[0]["total_price"] == cheapest_pair + leg_price(later[0][0]) + leg_price(later[1][0])
+    for itinerary in itineraries:
+        legs = itinerary["legs"]
+        for earlier, later_leg in zip(legs, legs[1:]):
+            assert compatible_pairs([earlier], [later_leg], 90)[0][0]
+
+
+def test_empty_when_no_itinerary_is_feasible():
+    first = [flight(100, "2030-05-01 17:00", "2030-05-01 20:00")]
+    second = [flight(100, "2030-05-01 08:00", "2030-05-01 10:00")]
+
+    assert k_best_itineraries([first, second], [90]) == []
+    assert k_best_itineraries([first, []], [90]) == []
+    assert k_best_itineraries([], []) == []
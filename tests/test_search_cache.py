@@ -0,0 +1,241 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import booking_function
+from booking_function import SerpAPIError, is_upstream_failure
+from search_cache import CircuitBreaker, CircuitOpenError, TTLCache, cached
+
+
+def fail(error):
+    def func():
+        raise error
+    return func
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def upstream_breaker(**kwargs):
+    return CircuitBreaker(is_failure=is_upstream_failure, **kwargs)
+
+
+def test_breaker_opens_after_threshold_and_fails_fast():
+    breaker = upstream_breaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(3):
+        assert breaker.state == "closed"
+        with pytest.raises(SerpAPIError):
+            breaker.call(fail(SerpAPIError("boom", status=503, transient=True)))
+
+    assert breaker.state == "open"
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: calls.append(1))
+    assert calls == []
+
+
+def test_breaker_success_resets_the_failure_count():
+    breaker = upstream_breaker(failure_threshold=2, reset_timeout=60)
+    with pytest.raises(SerpAPIError):
+        breaker.call(fail(SerpAPIError("timeout", transient=True)))
+    assert breaker.call(lambda: "ok") == "ok"
+    with pytest.raises(SerpAPIError):
+        breaker.call(fail(SerpAPIError("timeout", transient=True)))
+    assert breaker.state == "closed"
+
+
+def test_half_open_trial_closes_or_reopens():
+    breaker = upstream_breaker(failure_threshold=1, reset_timeout=0.05)
+    with pytest.raises(SerpAPIError):
+        breaker.call(fail(SerpAPIError("rate limited", status=429, transient=True)))
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    with pytest.raises(SerpAPIError):
+        breaker.call(fail(SerpAPIError("still down", status=502, transient=True)))
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_half_open_lets_only_one_trial_through():
+    breaker = upstream_breaker(failure_threshold=1, reset_timeout=0.05)
+    with pytest.raises(SerpAPIError):
+        breaker.call(fail(SerpAPIError("down", status=500, transient=True)))
+    time.sleep(0.06)
+
+    trial_started = threading.Event()
+    release = threading.Event()
+
+    def trial():
+        trial_started.set()
+        release.wait(2)
+        return "ok"
+
+    thread = threading.Thread(target=breaker.call, args=(trial,))
+    thread.start()
+    trial_started.wait(2)
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "second")
+    release.set()
+    thread.join()
+    assert breaker.state == "closed"
+
+
+@pytest.mark.parametrize("error", [
+    ValueError("SERPAPI_API_KEY not found in environment variables"),
+    SerpAPIError("SerpAPI returned 400: Invalid booking_token", status=400),
+    SerpAPIError("SerpAPI error: Unsupported departure_id"),
+])
+def test_breaker_ignores_errors_that_are_not_upstream_failures(error):
+    breaker = upstream_breaker(failure_threshold=1, reset_timeout=60)
+    for _ in range(3):
+        with pytest.raises(type(error)):
+            breaker.call(fail(error))
+    assert breaker.state == "closed"
+
+
+def test_upstream_failure_is_found_through_wrapping_errors():
+    try:
+        try:
+            raise SerpAPIError("SerpAPI request failed: read timed out", transient=True)
+        except SerpAPIError as e:
+            raise RuntimeError("Outbound flight search failed") from e
+    except RuntimeError as wrapped:
+        assert is_upstream_failure(wrapped)
+    assert not is_upstream_failure(RuntimeError("Failed to get booking URL"))
+
+
+def test_stale_entry_is_served_while_it_refreshes():
+    cache = TTLCache(ttl=0.05, stale_ttl=60, jitter=0)
+    values = iter(["old", "new"])
+    func = lambda: next(values)
+
+    assert cache.lookup("key", func).value == "old"
+    time.sleep(0.06)
+
+    result = cache.lookup("key", func)
+    assert (result.value, result.stale, result.hit) == ("old", True, True)
+    wait_for(lambda: cache.in_flight() == 0)
+    result = cache.lookup("key", func)
+    assert (result.value, result.stale) == ("new", False)
+
+
+def test_failed_refresh_keeps_the_stale_entry_and_counts_against_the_breaker():
+    breaker = upstream_breaker(failure_threshold=1, reset_timeout=60)
+    cache = TTLCache(ttl=0.05, stale_ttl=60, jitter=0, breaker=breaker)
+    cache.lookup("key", lambda: ["cached flight"])
+    time.sleep(0.06)
+
+    error_reply = fail(SerpAPIError("SerpAPI returned 429: Too many requests", status=429, transient=True))
+    assert cache.lookup("key", error_reply).value == ["cached flight"]
+    wait_for(lambda: cache.in_flight() == 0)
+
+    result = cache.lookup("key", error_reply)
+    assert (result.value, result.stale) == (["cached flight"], True)
+    assert breaker.state == "open"
+
+
+def test_caller_can_refuse_stale_entries():
+    cache = TTLCache(ttl=0.05, stale_ttl=60, jitter=0)
+    values = iter(["old", "new"])
+    func = lambda: next(values)
+    cache.lookup("key", func)
+    time.sleep(0.06)
+
+    result = cache.lookup("key", func, stale_ttl=0)
+    assert (result.value, result.stale, result.hit) == ("new", False, False)
+    assert cache.lookup("key", func).value == "new"
+
+
+def test_cached_wrappers_share_entries_but_not_stale_windows():
+    cache = TTLCache(ttl=0.05, stale_ttl=60, jitter=0)
+    calls = []
+
+    def search(route):
+        calls.append(route)
+        return f"{route} #{len(calls)}"
+
+    relaxed = cached(search, cache)
+    fresh = cached(search, cache, stale_ttl=0)
+    assert fresh(route="ATL-CDG") == "ATL-CDG #1"
+    assert relaxed(route="ATL-CDG") == "ATL-CDG #1"
+
+    time.sleep(0.06)
+    assert relaxed(route="ATL-CDG") == "ATL-CDG #1"  # Stale, refreshing in the background
+    wait_for(lambda: cache.in_flight() == 0)
+    time.sleep(0.06)
+    assert fresh(route="ATL-CDG") == "ATL-CDG #3"
+
+
+def test_miss_does_not_cache_a_failure():
+    cache = TTLCache(ttl=60, jitter=0)
+    with pytest.raises(SerpAPIError):
+        cache.lookup("key", fail(SerpAPIError("down", status=503, transient=True)))
+    assert cache.expires_in("key") is None
+    assert cache.lookup("key", lambda: "ok").value == "ok"
+
+
+@pytest.fixture
+def serpapi_backend(monkeypatch):
+    """Local stand-in for SerpAPI that answers every search with the configured reply."""
+    reply = {"status": 200, "body": {}}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(reply["body"]).encode()
+            self.send_response(reply["status"])
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("SERPAPI_BACKEND", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setenv("SERPAPI_API_KEY", "test")
+    booking_function.get_search_class.cache_clear()
+    yield reply
+    server.shutdown()
+    booking_function.get_search_class.cache_clear()
+
+
+def search():
+    return booking_function.search_outbound_flights(
+        departure_id="AMS", arrival_id="JFK", outbound_date="2030-05-01", return_date="2030-05-08",
+    )
+
+
+@pytest.mark.parametrize("status,transient", [(429, True), (503, True), (400, False)])
+def test_error_status_raises(serpapi_backend, status, transient):
+    serpapi_backend.update(status=status, body={"error": "Something went wrong"})
+    with pytest.raises(RuntimeError) as excinfo:
+        search()
+    assert is_upstream_failure(excinfo.value) == transient
+
+
+def test_error_in_successful_reply_raises(serpapi_backend):
+    serpapi_backend["body"] = {"error": "Invalid API key. Your API key should be here: https://serpapi.com/manage-api-key"}
+    with pytest.raises(RuntimeError) as excinfo:
+        search()
+    assert not is_upstream_failure(excinfo.value)
+
+
+def test_search_without_flights_is_an_empty_result(serpapi_backend):
+    serpapi_backend["body"] = {"error": "Google Flights hasn't returned any results for this query."}
+    assert search() == []
+    serpapi_backend["body"] = {"best_flights": [{"price": 100}]}
+    assert search() == [{"price": 100}]
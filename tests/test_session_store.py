@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+import session_store
+from session_store import (
+    MemorySessionStore, SQLiteSessionStore, SessionTooLarge, deserialize, serialize_within_cap,
+)
+
+
+def noise(rng, size):
+    """Text that barely compresses, so tests control the serialized size."""
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(size))
+
+
+def conversation(exchanges, size=500):
+    rng = random.Random(exchanges)
+    messages = []
+    for i in range(exchanges):
+        messages.append({"role": "user", "content": f"{i}:{noise(rng, size)}"})
+        messages.append({"role": "assistant", "content": f"{i}:{noise(rng, size)}"})
+    return {"messages": messages, "flight_params": {"departure_id": "ATL"}}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_store.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, clock):
+    if request.param == "memory":
+        return MemorySessionStore(idle_timeout=600)
+    return SQLiteSessionStore(str(tmp_path / "sessions.db"), idle_timeout=600)
+
+
+def test_state_under_cap_is_kept_whole():
+    state = conversation(3)
+    blob, stored = serialize_within_cap(state, max_bytes=64 * 1024)
+    assert stored == state
+    assert deserialize(blob) == state
+
+
+def test_oldest_exchanges_are_trimmed_to_fit_cap():
+    state = conversation(40)
+    blob, stored = serialize_within_cap(state, max_bytes=8 * 1024)
+
+    assert len(blob) <= 8 * 1024
+    assert deserialize(blob) == stored
+    assert 0 < len(stored["messages"]) < len(state["messages"])
+    assert stored["messages"] == state["messages"][-len(stored["messages"]):]
+    assert stored["messages"][0]["role"] == "user"
+    assert stored["flight_params"] == state["flight_params"]
+    assert len(state["messages"]) == 80  # The caller's state is left alone
+
+
+def test_state_too_large_without_history_raises():
+    state = {"messages": conversation(2)["messages"], "flights": [noise(random.Random(1), 20_000)]}
+    with pytest.raises(SessionTooLarge):
+        serialize_within_cap(state, max_bytes=4 * 1024)
+
+
+def test_save_returns_trimmed_state(store):
+    store.max_session_bytes = 8 * 1024
+    stored = store.save("a", conversation(40))
+    assert store.load("a") == stored
+    assert len(stored["messages"]) < 80
+
+
+def test_evict_idle_drops_only_idle_sessions(store, clock):
+    store.save("idle", {"messages": []})
+    store.save("active", {"messages": []})
+    clock.now += 400
+    store.save("active", {"messages": [{"role": "user", "content": "hi"}]})
+    clock.now += 400
+
+    assert store.load("idle") is None  # Past the idle timeout even before a sweep
+    assert store.evict_idle() == 1
+    assert store.load("active") == {"messages": [{"role": "user", "content": "hi"}]}
+    assert store.evict_idle() == 0
+
+
+def test_memory_store_evicts_least_recently_used(clock):
+    store = MemorySessionStore(max_sessions=2)
+    store.save("a", {"messages": []})
+    store.save("b", {"messages": []})
+    store.load("a")
+    store.save("c", {"messages": []})
+
+    assert store.load("b") is None
+    assert store.load("a") is not None
+    assert store.load("c") is not None
+
+
+def test_delete(store):
+    store.save("a", {"messages": []})
+    store.delete("a")
+    assert store.load("a") is None